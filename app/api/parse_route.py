@@ -1,20 +1,56 @@
 import os
 import time
+import asyncio
+import hashlib
 import tempfile
 import logging
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
 
+from app.core.config import settings
 from app.models.response import ParseResponse
-from app.service.document_parser import get_file_type, parse_document, SUPPORTED_EXTENSIONS
-from app.utils.image_extractor import extract_and_replace_images
+from app.service.cache import get_cached_result, store_result
+from app.service.document_parser import (
+    create_parser_executor, get_file_type, join_document_pages, parse_document_pages,
+    parse_document_with_images, split_document, PAGED_FILE_TYPES, SUPPORTED_EXTENSIONS
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Uploads are copied to disk in blocks of this size so peak memory stays
+# bounded regardless of the file size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def _parse_in_executor(executor, file_path: str, file_type: str):
+    """
+    Parse a document and extract its images in the parser process pool.
+
+    Large documents that split_document divides into page ranges have
+    their ranges converted concurrently by workers of the same pool, so
+    parallel page conversion never starts processes of its own.
+    """
+    loop = asyncio.get_running_loop()
+    page_ranges = None
+    if file_type in PAGED_FILE_TYPES:
+        page_ranges = await loop.run_in_executor(executor, split_document, file_path, file_type)
+
+    if not page_ranges:
+        return await loop.run_in_executor(
+            executor, parse_document_with_images, file_path, file_type
+        )
+
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(executor, parse_document_pages, file_path, file_type, pages)
+        for pages in page_ranges
+    ))
+    return await loop.run_in_executor(executor, join_document_pages, parts)
+
 
 @router.post("/parse-file", response_model=ParseResponse)
-async def parse_file(file: UploadFile = File(...)):
+async def parse_file(request: Request, file: UploadFile = File(...)):
     """
     Parse an uploaded file and convert it to Markdown.
 
@@ -37,19 +73,59 @@ async def parse_file(file: UploadFile = File(...)):
             detail=str(e) + f". Supported types: {', '.join(SUPPORTED_EXTENSIONS.keys())}"
         )
 
-    # Save uploaded file to temp location
+    # Save uploaded file to temp location. Parser processes read it from
+    # disk, so the upload is never held or pickled in the server process.
     temp_file = None
     try:
         # Create temp file with correct extension
         suffix = ext
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-        content = await file.read()
-        temp_file.write(content)
+        max_bytes = settings.max_file_size_mb * 1024 * 1024
+        bytes_written = 0
+        hasher = hashlib.blake2b(digest_size=16)
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            bytes_written += len(chunk)
+            if bytes_written > max_bytes:
+                temp_file.close()
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File exceeds maximum size of {settings.max_file_size_mb} MB"
+                )
+            hasher.update(chunk)
+            temp_file.write(chunk)
         temp_file.close()
+        digest = hasher.hexdigest()
+
+        # Identical uploads are served from the cache without re-parsing
+        cached = get_cached_result(digest, file_type)
+        if cached is not None:
+            modified_content, images = cached
+            return ParseResponse(
+                filename=file.filename,
+                file_type=file_type,
+                parsed_md_content=modified_content,
+                processing_time=round(time.time() - start_time, 3),
+                images=images
+            )
 
-        # Parse the document
+        # Parse the document and extract images with UUID references.
+        # Parsing is CPU-bound, so it runs in the process pool to keep the
+        # event loop free for concurrent requests.
+        executor = request.app.state.executor
         try:
-            markdown_content = parse_document(temp_file.name, file_type)
+            modified_content, images = await _parse_in_executor(executor, temp_file.name, file_type)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed when out of memory), which leaves
+            # the pool unusable. Replace it once, so only the requests that
+            # were running on it fail.
+            logger.error(f"Parser process died while parsing {file.filename}")
+            if request.app.state.executor is executor:
+                request.app.state.executor = create_parser_executor()
+                executor.shutdown(wait=False)
+            raise HTTPException(
+                status_code=500,
+                detail="Parser process terminated unexpectedly"
+            )
         except RuntimeError as e:
             raise HTTPException(status_code=500, detail=str(e))
         except Exception as e:
@@ -59,8 +135,7 @@ async def parse_file(file: UploadFile = File(...)):
                 detail=f"Failed to parse file: {str(e)}"
             )
 
-        # Extract images and replace with UUID references
-        modified_content, images = extract_and_replace_images(markdown_content)
+        store_result(digest, file_type, (modified_content, images))
 
         processing_time = time.time() - start_time
 
@@ -74,5 +149,8 @@ async def parse_file(file: UploadFile = File(...)):
 
     finally:
         # Clean up temp file
-        if temp_file and os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
+        if temp_file:
+            try:
+                os.unlink(temp_file.name)
+            except FileNotFoundError:
+                pass
@@ -1,9 +1,30 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     app_name: str = "Simplified AI Parser"
     max_file_size_mb: int = 50
+    cache_enabled: bool = True
+    cache_max_entries: int = 128
+    # Upper bound on the characters of markdown and base64 images cached
+    cache_max_size: int = 256 * 1024 * 1024
+    # Number of parser processes, defaults to the number of CPUs
+    parser_workers: Optional[int] = None
+    # Convert PDFs with the original mutool → HTML pipeline; pymupdf4llm
+    # is used when disabled, which is about ten times slower per page
+    pdf_use_mutool: bool = True
+    # Large PDFs are split into page ranges parsed by parallel processes
+    pdf_page_workers: int = 4
+    pdf_parallel_min_pages: int = 32
+    # Threads used to convert the slides or sheets of one document
+    parser_threads: int = 4
+    # Convert cleaned HTML with markdownify instead of the built-in emitter
+    markdown_use_markdownify: bool = False
+    # Downscale PPTX and XLSX images wider or taller than
+    # image_max_dimension pixels, for smaller output
+    image_downscale_enabled: bool = False
+    image_max_dimension: int = 1600
 
     class Config:
         env_file = ".env"
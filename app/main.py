@@ -1,12 +1,43 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from app.api.parse_route import router as parse_router
+from app.service.document_parser import create_parser_executor, parser_worker_count
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parsers are CPU-bound and run in a pool of spawned processes
+    workers = parser_worker_count()
+    app.state.executor = create_parser_executor()
+    # Workers are spawned on demand; start them all (running the warm-up
+    # initializer) before serving so the first requests skip the imports
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(
+        loop.run_in_executor(app.state.executor, os.getpid)
+        for _ in range(workers)
+    ))
+    yield
+    # Waiting for the workers to exit blocks, so do it off the event loop
+    await asyncio.to_thread(app.state.executor.shutdown)
+
 
 app = FastAPI(
     title="Simplified AI Parser",
     description="Lightweight document-to-Markdown conversion service",
     version="0.1.0",
+    lifespan=lifespan,
+    # orjson serializes the large markdown strings much faster than stdlib json
+    default_response_class=ORJSONResponse,
 )
 
+# Markdown output is highly compressible text
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 app.include_router(parse_router, prefix="/v1")
 
 
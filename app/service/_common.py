@@ -0,0 +1,110 @@
+"""
+Shared helpers for the document parsers.
+"""
+
+import io
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from PIL import Image
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Runs of two or more blank (or whitespace-only) lines. Spelled without a
+# counted repeat, which the regex engine matches noticeably faster.
+BLANK_LINES_PATTERN = re.compile(r"\n[^\S\n]*\n(?:[^\S\n]*\n)+")
+
+# Pipes and newlines in table cells, escaped in a single translate() pass
+TABLE_CELL_ESCAPES = str.maketrans({"|": "\\|", "\n": "<br>"})
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+
+
+def collapse_blank_lines(markdown_content: str) -> str:
+    """
+    Collapse consecutive blank lines into a single blank line and strip
+    leading/trailing whitespace from the document.
+    """
+    return BLANK_LINES_PATTERN.sub("\n\n", markdown_content).strip()
+
+
+@lru_cache(maxsize=64)
+def table_separator(column_count: int) -> str:
+    """Markdown table separator row for a table with column_count columns."""
+    return "| " + " | ".join(["---"] * column_count) + " |"
+
+
+def get_image_format(img_data: bytes) -> str:
+    """
+    Get the lowercase format name of an image.
+
+    PNG and JPEG, the supported formats, are recognized from their file
+    signature. Other images are opened with PIL, which only reads the header.
+    """
+    if img_data.startswith(PNG_SIGNATURE):
+        return "png"
+    if img_data.startswith(JPEG_SIGNATURE):
+        return "jpeg"
+
+    with io.BytesIO(img_data) as buffer:
+        with Image.open(buffer) as pil_img:
+            return pil_img.format.lower() if pil_img.format else "png"
+
+
+def downscale_image(img_data: bytes, img_format: str) -> tuple[bytes, str]:
+    """
+    Return (data, format) of an image, downscaled to fit within
+    image_max_dimension when image_downscale_enabled is set and the image
+    is larger. Other images are returned unchanged.
+
+    Downscaled images are saved as 8-bit RGB or grayscale PNGs, with
+    transparency flattened onto white. extract_and_replace_images keeps
+    such PNGs as they are, while it would re-encode any other format.
+    """
+    if not settings.image_downscale_enabled:
+        return img_data, img_format
+
+    max_dimension = settings.image_max_dimension
+    try:
+        with io.BytesIO(img_data) as input_buffer:
+            with Image.open(input_buffer) as img:
+                if max(img.size) <= max_dimension:
+                    return img_data, img_format
+
+                # Let the JPEG decoder skip detail that would be scaled away
+                img.draft(img.mode, (max_dimension, max_dimension))
+
+                # Flatten transparency onto white, as the image extractor does
+                if img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info:
+                    rgba = img.convert("RGBA")
+                    img = Image.new("RGB", rgba.size, (255, 255, 255))
+                    img.paste(rgba, mask=rgba.getchannel("A"))
+                elif img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+
+                img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+                with io.BytesIO() as output_buffer:
+                    img.save(output_buffer, format="png")
+                    return output_buffer.getvalue(), "png"
+    except Exception as e:
+        logger.warning(f"Failed to downscale image: {e}")
+        return img_data, img_format
+
+
+def map_in_threads(func, *iterables, max_workers: int) -> list:
+    """
+    Return [func(*args) for args in zip(*iterables)], computed by up to
+    max_workers threads. Results keep the input order. A single item is
+    converted inline without starting a thread pool.
+    """
+    items = list(zip(*iterables))
+    workers = min(max_workers, len(items))
+    if workers <= 1:
+        return [func(*args) for args in items]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda args: func(*args), items))
@@ -0,0 +1,78 @@
+"""
+Parse Result Cache
+
+Keeps recently parsed documents in memory, keyed by a content hash of the
+uploaded bytes, so re-uploading the same file skips the conversion pipeline.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+ParseResult = Tuple[str, Dict[str, str]]
+
+_cache: "OrderedDict[str, ParseResult]" = OrderedDict()
+_sizes: Dict[str, int] = {}
+_total_size = 0
+_lock = threading.Lock()
+
+
+def _make_key(digest: str, file_type: str) -> str:
+    return f"{file_type}:{digest}"
+
+
+def _result_size(result: ParseResult) -> int:
+    """Size of a result: characters of the markdown and its base64 images."""
+    markdown, images = result
+    return len(markdown) + sum(len(image) for image in images.values())
+
+
+def get_cached_result(digest: str, file_type: str) -> Optional[ParseResult]:
+    """
+    Look up a previously parsed result.
+
+    Args:
+        digest: Hex digest of the uploaded file content
+        file_type: Type of the file (docx, xlsx, pdf, ...)
+
+    Returns:
+        Tuple of (markdown, images) or None on a cache miss
+    """
+    if not settings.cache_enabled:
+        return None
+
+    key = _make_key(digest, file_type)
+    with _lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+        return result
+
+
+def store_result(digest: str, file_type: str, result: ParseResult) -> None:
+    """
+    Store a parsed result, evicting the least recently used entries
+    once cache_max_entries or cache_max_size is exceeded. Results larger
+    than cache_max_size are not cached.
+    """
+    global _total_size
+
+    if not settings.cache_enabled:
+        return
+
+    size = _result_size(result)
+    if size > settings.cache_max_size:
+        return
+
+    key = _make_key(digest, file_type)
+    with _lock:
+        _total_size += size - _sizes.get(key, 0)
+        _sizes[key] = size
+        _cache[key] = result
+        _cache.move_to_end(key)
+        while (len(_cache) > settings.cache_max_entries
+               or _total_size > settings.cache_max_size):
+            evicted_key, _ = _cache.popitem(last=False)
+            _total_size -= _sizes.pop(evicted_key)
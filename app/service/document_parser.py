@@ -21,13 +21,22 @@ What's preserved:
 
 import os
 import logging
-from typing import Tuple
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from lxml import html as lxml_html
 
-from app.service.docx_parser import parse_docx_to_markdown
+from app.core.config import settings
+from app.service.docx_parser import HTML_PARSER, _clean_and_filter, parse_docx_to_markdown
 from app.service.xlsx_parser import parse_xlsx_to_markdown
-from app.service.pdf_parser import parse_pdf_to_markdown
+from app.service.pdf_parser import (
+    parse_pdf_pages_to_markdown, parse_pdf_to_markdown, split_pdf_pages
+)
 from app.service.markdown_parser import parse_markdown
 from app.service.pptx_parser import parse_pptx_to_markdown
+from app.service.markdown_emitter import tree_to_markdown
+from app.service._common import collapse_blank_lines
+from app.utils.image_extractor import extract_and_replace_images
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +53,9 @@ SUPPORTED_EXTENSIONS = {
     ".ppt": "ppt",
 }
 
+# File types that split_document can divide into page ranges
+PAGED_FILE_TYPES = {"pdf"}
+
 
 def get_file_type(filename: str) -> Tuple[str, str]:
     """
@@ -68,10 +80,10 @@ def parse_document(file_path: str, file_type: str) -> str:
     Parse a document and convert it to Markdown.
 
     Routing logic matches original document_parser.py convert_document_to_html:
-    - .docx: mammoth → HTML → markdownify → Markdown
+    - .docx: mammoth → HTML → Markdown
     - .xlsx/.xlsm: openpyxl → Markdown tables (original uses LibreOffice → HTML)
     - .xls: Same as xlsx (may require conversion for old formats)
-    - .pdf: mutool → HTML → markdownify → Markdown
+    - .pdf: mutool → HTML → Markdown (or pymupdf4llm → Markdown)
     - .md/.markdown: Passthrough with image filtering
 
     Args:
@@ -125,3 +137,93 @@ def parse_document(file_path: str, file_type: str) -> str:
 
     else:
         raise ValueError(f"Unknown file type: {file_type}")
+
+
+def parse_document_with_images(file_path: str, file_type: str) -> Tuple[str, Dict[str, str]]:
+    """
+    Parse a document and extract its inline images.
+
+    This is the unit of work submitted to the parser process pool, so both
+    the conversion and the image re-encoding run off the event loop.
+
+    Args:
+        file_path: Path to the document file
+        file_type: Type of the file (docx, xlsx, xls, xlsm, pdf, markdown)
+
+    Returns:
+        Tuple of (markdown with image references, images dictionary)
+    """
+    markdown_content = parse_document(file_path, file_type)
+    return extract_and_replace_images(markdown_content)
+
+
+def split_document(file_path: str, file_type: str) -> Optional[List[List[int]]]:
+    """
+    Split a document into page ranges that parse_document_pages can
+    convert in separate processes.
+
+    Args:
+        file_path: Path to the document file
+        file_type: Type of the file, one of PAGED_FILE_TYPES
+
+    Returns:
+        List of page ranges, or None if the document should be converted
+        as a whole with parse_document_with_images
+    """
+    page_ranges = split_pdf_pages(file_path)
+    if page_ranges:
+        logger.info(f"Parsing {file_type} file in {len(page_ranges)} page ranges: {file_path}")
+    return page_ranges
+
+
+def parse_document_pages(file_path: str, file_type: str, pages: List[int]) -> str:
+    """
+    Convert one page range returned by split_document to Markdown. The
+    results of all ranges are combined with join_document_pages.
+    """
+    return parse_pdf_pages_to_markdown(file_path, pages)
+
+
+def join_document_pages(parts: List[str]) -> Tuple[str, Dict[str, str]]:
+    """
+    Join the Markdown of the page ranges of a document in page order and
+    extract its inline images, like parse_document_with_images.
+    """
+    markdown_content = collapse_blank_lines("".join(parts))
+    return extract_and_replace_images(markdown_content)
+
+
+def warm_up_parser() -> None:
+    """
+    Warm up a parser process.
+
+    Used as the process pool initializer: the parser modules are imported
+    when this module is unpickled in the worker, and a tiny HTML document
+    is cleaned and converted so the first real request does not pay for
+    the lazy setup inside lxml and the Markdown conversion.
+    """
+    tree = lxml_html.document_fromstring(
+        "<html><body><p></p></body></html>", parser=HTML_PARSER
+    )
+    _clean_and_filter(tree)
+    tree_to_markdown(tree)
+
+
+def parser_worker_count() -> int:
+    """Number of parser processes, defaulting to the number of CPUs."""
+    return settings.parser_workers or os.cpu_count() or 1
+
+
+def create_parser_executor() -> ProcessPoolExecutor:
+    """
+    Create the process pool that runs parse_document_with_images.
+
+    Parsers are CPU-bound and run in separate processes. The pool uses
+    spawn so workers never inherit the server's threads or locks, and
+    warms up each worker when it starts.
+    """
+    return ProcessPoolExecutor(
+        max_workers=parser_worker_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warm_up_parser,
+    )
@@ -1,34 +1,66 @@
 """
 DOCX to Markdown Parser
 
-Uses mammoth to convert DOCX to HTML, then markdownify to convert to Markdown.
-This matches the original ai-parser DOCX conversion flow.
+Uses mammoth to convert DOCX to HTML, then converts the cleaned HTML tree to
+Markdown. This matches the original ai-parser DOCX conversion flow.
 """
 
-import base64
 import re
 import mammoth
-from bs4 import BeautifulSoup
-from markdownify import markdownify
+import pybase64
+from lxml import html as lxml_html
+
+from app.service._common import collapse_blank_lines
+from app.service.markdown_emitter import tree_to_markdown
 
 
 SUPPORTED_IMAGE_FORMATS = ["png", "jpg", "jpeg"]
 EMBEDDED_OBJECT_SRC = "embedded_object_src"
 EMBEDDED_OBJECT_ICON = "📎"
 
+EMBEDDED_OBJECT_PATTERN = re.compile(rf'<img[^>]*{EMBEDDED_OBJECT_SRC}[^>]*>')
+DATA_URI_FORMAT_PATTERN = re.compile(r"^data:image/(\w+);base64")
+
+# HTML comments are dropped while parsing (matching original _clean_html)
+HTML_PARSER = lxml_html.HTMLParser(remove_comments=True)
+
+# Tags removed together with their content (matching original _clean_html)
+TAGS_TO_REMOVE = {"head", "style", "script", "video", "audio"}
 
-def _convert_image(image):
+# Style and layout attributes stripped from every element (matching original list)
+ATTRS_TO_REMOVE = frozenset([
+    "style", "align", "valign", "bgcolor", "sdval", "sdnum",
+    "height", "width", "cellspacing", "border", "span",
+    "hspace", "vspace", "data-sheets-value",
+    "data-sheets-numberformat", "data-sheets-formula"
+])
+
+
+def _make_image_handler():
     """
-    Convert embedded image to base64 data URI.
-    Matches original behavior from document_parser.py:1378-1383
+    Create the mammoth image converter for one document.
+
+    Returns the converter and its state dict; state["seen_embedded"] is
+    set once an EMF/WMF embedded object has been converted, so the
+    placeholder replacement can be skipped for documents without any.
     """
-    # EMF/WMF are embedded objects, not actual images - mark them for replacement
-    if image.content_type in ["image/x-emf", "image/x-wmf"]:
-        return {"src": EMBEDDED_OBJECT_SRC}
+    state = {"seen_embedded": False}
 
-    with image.open() as image_file:
-        image_data = base64.b64encode(image_file.read()).decode("utf-8")
-    return {"src": f"data:{image.content_type};base64,{image_data}"}
+    def convert_image(image):
+        """
+        Convert embedded image to base64 data URI.
+        Matches original behavior from document_parser.py:1378-1383
+        """
+        # EMF/WMF are embedded objects, not actual images - mark them for replacement
+        if image.content_type in ["image/x-emf", "image/x-wmf"]:
+            state["seen_embedded"] = True
+            return {"src": EMBEDDED_OBJECT_SRC}
+
+        with image.open() as image_file:
+            image_data = pybase64.b64encode_as_string(image_file.read())
+        return {"src": f"data:{image.content_type};base64,{image_data}"}
+
+    return convert_image, state
 
 
 def _replace_embedded_object_with_icon(html_content: str) -> str:
@@ -36,80 +68,65 @@ def _replace_embedded_object_with_icon(html_content: str) -> str:
     Replace embedded object placeholders with icon.
     Matches original document_parser.py:1375-1376
     """
-    pattern = re.compile(rf'<img[^>]*{EMBEDDED_OBJECT_SRC}[^>]*>')
-    return pattern.sub(EMBEDDED_OBJECT_ICON, html_content)
+    return EMBEDDED_OBJECT_PATTERN.sub(EMBEDDED_OBJECT_ICON, html_content)
 
 
-def _clean_html(html_content: str) -> str:
+def _is_unsupported_image(src: str) -> bool:
     """
-    Clean HTML content by removing unnecessary elements.
-    Matches original document_parser.py _clean_html method.
+    Check if an image src points to an unsupported format.
+    Matches original _contain_unsupported_image behavior.
     """
-    soup = BeautifulSoup(html_content, "html.parser")
-
-    # Remove head tag
-    head = soup.head
-    if head:
-        head.decompose()
-
-    # Remove style, script, video, audio tags
-    for tag_name in ["style", "script", "video", "audio"]:
-        for tag in soup.find_all(tag_name):
-            tag.decompose()
+    if not src or not src.startswith("data:image/"):
+        return False
 
-    # Remove style attributes
-    for element in soup.find_all(style=True):
-        del element["style"]
+    # Extract format from base64 data URI
+    matches = DATA_URI_FORMAT_PATTERN.match(src)
+    if not matches:
+        return False
 
-    # Remove layout attributes (matching original list)
-    attrs_to_remove = [
-        "align", "valign", "bgcolor", "sdval", "sdnum",
-        "height", "width", "cellspacing", "border", "span",
-        "hspace", "vspace", "data-sheets-value",
-        "data-sheets-numberformat", "data-sheets-formula"
-    ]
-    for attr in attrs_to_remove:
-        for element in soup.find_all(attrs={attr: True}):
-            del element[attr]
+    return matches.group(1).lower() not in SUPPORTED_IMAGE_FORMATS
 
-    # Unwrap font tags
-    for font in soup.find_all("font"):
-        font.unwrap()
 
-    # Remove comment indicators
-    for indicator in soup.find_all(class_="comment-indicator"):
-        indicator.decompose()
-
-    # Remove HTML comments
-    html_without_comments = re.sub(r"<!--[\s\S]*?-->", "", str(soup))
-
-    return html_without_comments
-
-
-def _filter_unsupported_images(html_content: str) -> str:
+def _clean_and_filter(tree) -> None:
     """
-    Remove images with unsupported formats from HTML.
-    Matches original _contain_unsupported_image behavior.
+    Clean the parsed HTML tree in place and remove images with unsupported
+    formats. Combines original document_parser.py _clean_html and
+    _contain_unsupported_image in a single walk over the lxml tree.
     Only keeps png, jpg, jpeg.
     """
-    soup = BeautifulSoup(html_content, "html.parser")
+    elements_to_drop = []
+    fonts_to_unwrap = []
+    for element in tree.iter():
+        tag = element.tag
+        # Comments and processing instructions have no string tag
+        if not isinstance(tag, str):
+            continue
 
-    for img in soup.find_all("img"):
-        src = img.get("src")
-        if not src:
+        # Remove head, style, script, video, audio tags and comment indicators
+        if tag in TAGS_TO_REMOVE or "comment-indicator" in element.classes:
+            elements_to_drop.append(element)
             continue
 
-        extension = ""
-        if src.startswith("data:image/"):
-            # Extract format from base64 data URI
-            matches = re.match(r"^data:image/(\w+);base64", src)
-            if matches:
-                extension = matches.group(1).lower()
+        # Remove unsupported images
+        if tag == "img" and _is_unsupported_image(element.get("src")):
+            elements_to_drop.append(element)
+            continue
+
+        # Unwrap font tags
+        if tag == "font":
+            fonts_to_unwrap.append(element)
 
-        if extension and extension not in SUPPORTED_IMAGE_FORMATS:
-            img.decompose()
+        # Remove style and layout attributes; elements carry only a few
+        # attributes, so check those rather than every name in the list
+        attrib = element.attrib
+        if attrib:
+            for attr in [attr for attr in attrib if attr in ATTRS_TO_REMOVE]:
+                del attrib[attr]
 
-    return str(soup)
+    for element in elements_to_drop:
+        element.drop_tree()
+    for font in fonts_to_unwrap:
+        font.drop_tag()
 
 
 def parse_docx_to_markdown(file_path: str) -> str:
@@ -119,9 +136,9 @@ def parse_docx_to_markdown(file_path: str) -> str:
     Processing steps (matching original document_parser.py):
     1. mammoth.convert_to_html with image conversion
     2. Replace embedded objects (EMF/WMF) with 📎 icon
-    3. Clean HTML (remove styles, scripts, layout attrs)
-    4. Filter unsupported image formats
-    5. Convert HTML to Markdown
+    3. Clean HTML (remove styles, scripts, layout attrs) and filter
+       unsupported image formats in a single pass
+    4. Convert HTML to Markdown
 
     Args:
         file_path: Path to the DOCX file
@@ -130,38 +147,30 @@ def parse_docx_to_markdown(file_path: str) -> str:
         Markdown content as string
     """
     # Step 1: Convert to HTML (matching original line 1094-1097)
+    convert_image, image_state = _make_image_handler()
     result = mammoth.convert_to_html(
         file_path,
-        convert_image=mammoth.images.img_element(_convert_image)
+        convert_image=mammoth.images.img_element(convert_image)
     )
     html_content = result.value
+    # The result object would keep the raw HTML alive for the whole pipeline
+    del result
 
     # Step 2: Replace embedded object placeholders with icon (matching original line 1099)
-    html_content = _replace_embedded_object_with_icon(html_content)
+    if image_state["seen_embedded"]:
+        html_content = _replace_embedded_object_with_icon(html_content)
 
-    # Step 3: Clean HTML (matching original line 1105)
-    html_content = _clean_html(html_content)
+    if not html_content.strip():
+        return ""
 
-    # Step 4: Filter unsupported images (matching original line 1106-1107)
-    html_content = _filter_unsupported_images(html_content)
+    # Step 3: Clean HTML and filter unsupported images (matching original line 1105-1107)
+    tree = lxml_html.document_fromstring(html_content, parser=HTML_PARSER)
+    del html_content
+    _clean_and_filter(tree)
 
-    # Step 5: Convert HTML to Markdown
-    markdown_content = markdownify(
-        html_content,
-        heading_style="ATX",
-        bullets="-",
-        strip=["style", "script"]
-    )
+    # Step 4: Convert HTML to Markdown
+    markdown_content = tree_to_markdown(tree)
+    del tree
 
     # Clean up extra whitespace
-    lines = markdown_content.split("\n")
-    cleaned_lines = []
-    prev_empty = False
-    for line in lines:
-        is_empty = not line.strip()
-        if is_empty and prev_empty:
-            continue
-        cleaned_lines.append(line)
-        prev_empty = is_empty
-
-    return "\n".join(cleaned_lines).strip()
+    return collapse_blank_lines(markdown_content)
@@ -0,0 +1,333 @@
+"""
+HTML to Markdown Emitter
+
+Converts a cleaned lxml HTML tree directly to Markdown, following the rules
+of markdownify (ATX headings, "-" bullets) for the tags mammoth and mutool
+produce. This avoids serializing the tree back to HTML and re-parsing it
+with BeautifulSoup, which dominated the conversion time.
+
+The markdownify flow is still available through the markdown_use_markdownify
+setting.
+"""
+
+import re
+from typing import List, Optional
+
+from lxml import html as lxml_html
+from markdownify import markdownify
+
+from app.core.config import settings
+
+
+WHITESPACE_PATTERN = re.compile(r"[\t ]+")
+ALL_WHITESPACE_PATTERN = re.compile(r"[\t \r\n]+")
+NEWLINE_WHITESPACE_PATTERN = re.compile(r"[\t \r\n]*[\r\n][\t \r\n]*")
+LINE_BEGINNING_PATTERN = re.compile(r"^", re.MULTILINE)
+
+HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+# Block elements: whitespace-only text inside and around them is dropped
+BLOCK_TAGS = frozenset([
+    "h1", "h2", "h3", "h4", "h5", "h6", "p", "blockquote", "ol", "ul", "li",
+    "table", "thead", "tbody", "tfoot", "tr", "td", "th",
+])
+BLOCK_OUTSIDE_TAGS = BLOCK_TAGS | {"pre"}
+
+# Text inside these elements is not escaped
+CODE_TAGS = frozenset(["pre", "code", "kbd", "samp"])
+
+# Inline elements wrapped in a markup symbol on both sides
+INLINE_MARKUP = {
+    "b": "**", "strong": "**",
+    "em": "*", "i": "*",
+    "del": "~~", "s": "~~",
+    "code": "`", "kbd": "`", "samp": "`",
+    "sub": "", "sup": "",
+}
+
+BULLET = "- "
+
+
+def _is_block(element) -> bool:
+    return element is not None and element.tag in BLOCK_OUTSIDE_TAGS
+
+
+def _has_text(text: Optional[str]) -> bool:
+    return bool(text) and not text.isspace()
+
+
+def _has_previous_sibling(element) -> bool:
+    """Whether element has a preceding element or non-blank text sibling."""
+    previous = element.getprevious()
+    if previous is not None:
+        return True
+    parent = element.getparent()
+    return parent is not None and _has_text(parent.text)
+
+
+def _next_sibling_tag(element) -> Optional[str]:
+    """
+    Return the tag of the element following element, "" when non-blank
+    text follows it, or None when element is the last child.
+    """
+    if _has_text(element.tail):
+        return ""
+    following = element.getnext()
+    return following.tag if following is not None else None
+
+
+def _chomp(text: str):
+    """
+    Move a leading or trailing space of inline content outside its markup,
+    so <b> foo</b> becomes " **foo**" rather than "** foo**".
+    """
+    prefix = " " if text and text[0] == " " else ""
+    suffix = " " if text and text[-1] == " " else ""
+    return prefix, suffix, text.strip()
+
+
+def _append_block(parts: List[str], text: str) -> None:
+    """
+    Append converted element output, keeping the longer of the newline runs
+    at the end of the accumulated output and at the start of text.
+    """
+    trailing = 0
+    while parts:
+        last = parts[-1]
+        stripped = last.rstrip("\n")
+        trailing += len(last) - len(stripped)
+        if stripped:
+            parts[-1] = stripped
+            break
+        parts.pop()
+    stripped = text.lstrip("\n")
+    parts.append("\n" * max(trailing, len(text) - len(stripped)))
+    parts.append(stripped)
+
+
+def _process_text(text: Optional[str], parent, previous, following,
+                  in_pre: bool, in_code: bool) -> str:
+    """Normalize and escape a text node between previous and following."""
+    if not text:
+        return ""
+
+    remove_inside = parent.tag in BLOCK_TAGS
+    strip_left = _is_block(previous) or (remove_inside and previous is None)
+    strip_right = _is_block(following) or (remove_inside and following is None)
+
+    # Whitespace-only text next to block elements is dropped entirely
+    if text.isspace() and (strip_left or strip_right):
+        return ""
+
+    if not in_pre:
+        text = NEWLINE_WHITESPACE_PATTERN.sub("\n", text)
+        text = WHITESPACE_PATTERN.sub(" ", text)
+    if not in_code:
+        text = text.replace("*", r"\*").replace("_", r"\_")
+
+    if strip_left:
+        text = text.lstrip()
+    if strip_right:
+        text = text.rstrip()
+    return text
+
+
+def _process_element(element, inline: bool, in_pre: bool, in_code: bool) -> str:
+    """
+    Convert element and its children to Markdown.
+
+    in_pre and in_code tell whether an ancestor of element is a pre or a
+    code-like element, which disables whitespace normalization and
+    escaping respectively.
+    """
+    tag = element.tag
+    if tag in ("script", "style"):
+        return ""
+
+    # Headings and table cells cannot contain block elements
+    children_inline = inline or tag in HEADING_LEVELS or tag in ("td", "th")
+    children_in_pre = in_pre or tag == "pre"
+    children_in_code = in_code or tag in CODE_TAGS
+
+    parts = []
+    children = [child for child in element if isinstance(child.tag, str)]
+    first = children[0] if children else None
+    parts.append(_process_text(
+        element.text, element, None, first, children_in_pre, children_in_code
+    ))
+    for index, child in enumerate(children):
+        _append_block(parts, _process_element(
+            child, children_inline, children_in_pre, children_in_code
+        ))
+        following = children[index + 1] if index + 1 < len(children) else None
+        parts.append(_process_text(
+            child.tail, element, child, following, children_in_pre, children_in_code
+        ))
+    text = "".join(parts)
+
+    return _convert(element, text, inline, in_code)
+
+
+def _convert(element, text: str, inline: bool, in_code: bool) -> str:
+    """Apply the Markdown markup for element to its converted content."""
+    tag = element.tag
+
+    if tag in INLINE_MARKUP:
+        if tag == "code" and element.getparent().tag == "pre":
+            return text
+        if in_code:
+            return text
+        prefix, suffix, text = _chomp(text)
+        if not text:
+            return ""
+        markup = INLINE_MARKUP[tag]
+        return f"{prefix}{markup}{text}{markup}{suffix}"
+
+    level = HEADING_LEVELS.get(tag)
+    if level is not None:
+        if inline:
+            return text
+        return f"\n{'#' * level} {ALL_WHITESPACE_PATTERN.sub(' ', text.strip())}\n\n"
+
+    if tag == "p":
+        if inline:
+            return " " + text.strip() + " "
+        return f"\n\n{text}\n\n" if text else ""
+
+    if tag == "a":
+        prefix, suffix, text = _chomp(text)
+        if not text:
+            return ""
+        href = element.get("href")
+        title = element.get("title")
+        if text.replace(r"\_", "_") == href and not title:
+            return f"<{href}>"
+        title_part = ' "%s"' % title.replace('"', r'\"') if title else ""
+        return f"{prefix}[{text}]({href}{title_part}){suffix}" if href else text
+
+    if tag == "img":
+        alt = element.get("alt") or ""
+        if inline:
+            return alt
+        src = element.get("src") or ""
+        title = element.get("title") or ""
+        title_part = ' "%s"' % title.replace('"', r'\"') if title else ""
+        return f"![{alt}]({src}{title_part})"
+
+    if tag == "br":
+        return "" if inline else "  \n"
+
+    if tag in ("ul", "ol"):
+        # Nested lists are attached to the enclosing list item
+        ancestor = element
+        while ancestor is not None:
+            if ancestor.tag == "li":
+                return "\n" + text.rstrip()
+            ancestor = ancestor.getparent()
+        following = _next_sibling_tag(element)
+        before_paragraph = following is not None and following not in ("ul", "ol")
+        return "\n\n" + text + ("\n" if before_paragraph else "")
+
+    if tag == "li":
+        parent = element.getparent()
+        if parent is not None and parent.tag == "ol":
+            start = parent.get("start")
+            start = int(start) if start and start.isnumeric() else 1
+            bullet = f"{start + parent.index(element)}. "
+        else:
+            bullet = BULLET
+        text = text.strip()
+        if text:
+            text = LINE_BEGINNING_PATTERN.sub(" " * len(bullet), text)
+            text = bullet + text[len(bullet):]
+        return text + "\n"
+
+    if tag == "table":
+        return "\n\n" + text + "\n"
+
+    if tag in ("td", "th"):
+        colspan = element.get("colspan")
+        colspan = int(colspan) if colspan and colspan.isdigit() else 1
+        return " " + text.strip().replace("\n", " ") + " |" * colspan
+
+    if tag == "tr":
+        return _convert_row(element, text)
+
+    if tag == "pre":
+        return f"\n```\n{text}\n```\n" if text else ""
+
+    if tag == "blockquote":
+        if inline:
+            return " " + text.strip() + " "
+        return "\n" + LINE_BEGINNING_PATTERN.sub("> ", text.strip()) + "\n\n" if text else ""
+
+    if tag == "hr":
+        return "\n\n---\n\n"
+
+    if tag == "caption":
+        return text + "\n"
+
+    if tag == "figcaption":
+        return "\n\n" + text + "\n\n"
+
+    # Other elements (html, body, div, span, ...) only contribute their content
+    return text
+
+
+def _convert_row(row, text: str) -> str:
+    """Convert a table row, adding the header separator after the first row."""
+    cells = list(row.iter("td", "th"))
+    parent = row.getparent()
+    has_previous = _has_previous_sibling(row)
+    grandparent = parent.getparent()
+    is_headrow = (
+        all(cell.tag == "th" for cell in cells)
+        or (not has_previous and parent.tag != "tbody")
+        or (not has_previous and parent.tag == "tbody"
+            and next(grandparent.iterdescendants("thead"), None) is None)
+    )
+
+    overline = ""
+    underline = ""
+    if is_headrow and not has_previous:
+        full_colspan = 0
+        for cell in cells:
+            colspan = cell.get("colspan")
+            full_colspan += int(colspan) if colspan and colspan.isdigit() else 1
+        underline = "| " + " | ".join(["---"] * full_colspan) + " |\n"
+    elif not has_previous and (
+        parent.tag == "table"
+        or (parent.tag == "tbody" and not _has_previous_sibling(parent))
+    ):
+        # First row of a table without a header: emit an empty header
+        overline = "| " + " | ".join([""] * len(cells)) + " |\n"
+        overline += "| " + " | ".join(["---"] * len(cells)) + " |\n"
+    return overline + "|" + text + "\n" + underline
+
+
+def html_to_markdown(tree) -> str:
+    """
+    Convert a parsed lxml HTML tree to Markdown.
+
+    Args:
+        tree: Root element of the cleaned HTML document
+
+    Returns:
+        Markdown content as string
+    """
+    return _process_element(tree, False, False, False)
+
+
+def tree_to_markdown(tree) -> str:
+    """
+    Convert a cleaned lxml HTML tree to Markdown, with markdownify when
+    markdown_use_markdownify is set and with html_to_markdown otherwise.
+    """
+    if settings.markdown_use_markdownify:
+        return markdownify(
+            lxml_html.tostring(tree, encoding="unicode"),
+            heading_style="ATX",
+            bullets="-",
+            strip=["style", "script"]
+        )
+    return html_to_markdown(tree)
@@ -16,35 +16,46 @@ logger = logging.getLogger(__name__)
 
 SUPPORTED_IMAGE_FORMATS = ["png", "jpg", "jpeg"]
 
+# Pattern to match markdown images: ![alt](src)
+IMAGE_PATTERN = re.compile(rb'!\[([^\]]*)\]\(([^)]+)\)')
+DATA_URI_FORMAT_PATTERN = re.compile(rb"data:image/(\w+);base64")
 
-def _filter_images(content: str) -> str:
+
+def _filter_images(content: bytes) -> bytes:
     """
     Filter markdown images to only keep base64 data URIs with supported formats.
     Matches original behavior that removes non-base64 images from markdown.
+
+    Works on the raw UTF-8 bytes so the file never has to be decoded
+    before filtering.
     """
-    # Pattern to match markdown images: ![alt](src)
-    img_pattern = re.compile(r'!\[([^\]]*)\]\(([^)]+)\)')
+    # Nothing to filter
+    if content.find(b"![") == -1:
+        return content
+
+    # Without any data URI every image is removed, no need to inspect each one
+    if content.find(b"data:image/") == -1:
+        return IMAGE_PATTERN.sub(b"", content)
 
     def process_image(match):
-        alt = match.group(1)
         src = match.group(2)
 
         # Only keep base64 images (matching original behavior)
-        if not src.startswith("data:image/"):
-            logger.info(f"Removing non-base64 image: {src[:50]}...")
-            return ""
+        if not src.startswith(b"data:image/"):
+            logger.info(f"Removing non-base64 image: {src[:50].decode('utf-8', 'replace')}...")
+            return b""
 
         # Check format
-        format_match = re.match(r"data:image/(\w+);base64", src)
+        format_match = DATA_URI_FORMAT_PATTERN.match(src)
         if format_match:
-            img_format = format_match.group(1).lower()
+            img_format = format_match.group(1).decode("ascii").lower()
             if img_format not in SUPPORTED_IMAGE_FORMATS:
                 logger.info(f"Removing unsupported image format: {img_format}")
-                return ""
+                return b""
 
         return match.group(0)
 
-    return img_pattern.sub(process_image, content)
+    return IMAGE_PATTERN.sub(process_image, content)
 
 
 def parse_markdown(file_path: str) -> str:
@@ -56,16 +67,22 @@ def parse_markdown(file_path: str) -> str:
     - Filter out non-base64 images
     - Filter out unsupported image formats (only png/jpg/jpeg allowed)
 
+    The content is filtered as bytes and only the result is decoded to text.
+
     Args:
         file_path: Path to the Markdown file
 
     Returns:
         Markdown content as string
     """
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
+    with open(file_path, "rb") as f:
+        data = f.read()
 
     # Filter images to match original behavior
-    content = _filter_images(content)
+    content = str(_filter_images(data), "utf-8")
+
+    # Normalize line endings like text-mode reading does
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
 
     return content
@@ -1,81 +1,134 @@
 """
 PDF to Markdown Parser
 
-Uses mutool (from mupdf-tools) to convert PDF to HTML,
-then markdownify to convert HTML to Markdown.
+Uses mutool (from mupdf-tools) to convert PDF to HTML, then converts
+the HTML to Markdown, like the original ai-parser.
 
-This matches the original ai-parser PDF conversion flow.
+With the pdf_use_mutool setting disabled, pymupdf4llm extracts Markdown
+directly from the PDF instead, and large PDFs are converted in parallel
+page ranges.
 """
 
 import os
 import re
-import base64
 import tempfile
 import logging
 from subprocess import run, CalledProcessError
-from bs4 import BeautifulSoup
-from markdownify import markdownify
+import pymupdf
+import pybase64
+from lxml import html as lxml_html
+
+from app.core.config import settings
+from app.service._common import collapse_blank_lines
+from app.service.markdown_emitter import tree_to_markdown
 
 logger = logging.getLogger(__name__)
 
 SUPPORTED_IMAGE_FORMATS = ["png", "jpg", "jpeg"]
 
+# Tags removed together with their content (matching original _clean_html)
+TAGS_TO_REMOVE = {"head", "style", "script", "video", "audio"}
+
+# Style and layout attributes stripped from every element (matching original list)
+ATTRS_TO_REMOVE = frozenset([
+    "style", "align", "valign", "bgcolor", "sdval", "sdnum",
+    "height", "width", "cellspacing", "border", "span",
+    "hspace", "vspace", "data-sheets-value",
+    "data-sheets-numberformat", "data-sheets-formula"
+])
+
+DATA_URI_FORMAT_PATTERN = re.compile(r"^data:image/(\w+);base64")
+FILE_EXTENSION_PATTERN = re.compile(r"\.([a-zA-Z0-9]+)(\?|$)")
 
-def _clean_html(html_content: str) -> str:
+# mutool writes UTF-8; without it libxml2 falls back to Latin-1 for HTML.
+# HTML comments are dropped while parsing (matching original _clean_html)
+HTML_PARSER = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True)
+
+
+def _is_unsupported_image(src: str) -> bool:
     """
-    Clean HTML content by removing unnecessary elements.
-    Matches original document_parser.py _clean_html behavior.
+    Check if an image src points to an unsupported format.
+    Matches original _contain_unsupported_image behavior.
     """
-    soup = BeautifulSoup(html_content, "html.parser")
+    if not src:
+        return False
 
-    # Remove head tag
-    head = soup.head
-    if head:
-        head.decompose()
+    extension = ""
+    if src.startswith("data:image/"):
+        # Extract format from base64 data URI
+        matches = DATA_URI_FORMAT_PATTERN.match(src)
+        if matches:
+            extension = matches.group(1).lower()
+    else:
+        # Extract from file extension
+        ext_matches = FILE_EXTENSION_PATTERN.search(src)
+        if ext_matches:
+            extension = ext_matches.group(1).lower()
 
-    # Remove style, script, video, audio tags
-    for tag_name in ["style", "script", "video", "audio"]:
-        for tag in soup.find_all(tag_name):
-            tag.decompose()
+    if extension and extension not in SUPPORTED_IMAGE_FORMATS:
+        logger.info(f"Removing unsupported image format: {extension}")
+        return True
 
-    # Remove style attributes
-    for element in soup.find_all(style=True):
-        del element["style"]
+    return False
 
-    # Remove layout attributes (matching original list)
-    attrs_to_remove = [
-        "align", "valign", "bgcolor", "sdval", "sdnum",
-        "height", "width", "cellspacing", "border", "span",
-        "hspace", "vspace", "data-sheets-value",
-        "data-sheets-numberformat", "data-sheets-formula"
-    ]
-    for attr in attrs_to_remove:
-        for element in soup.find_all(attrs={attr: True}):
-            del element[attr]
 
-    # Unwrap font tags
-    for font in soup.find_all("font"):
-        font.unwrap()
+def _clean_and_filter(tree) -> None:
+    """
+    Clean the parsed HTML tree in place and remove images with unsupported
+    formats.
+    Combines original document_parser.py _clean_html and
+    _contain_unsupported_image in a single walk over the lxml tree.
+    Only keeps png, jpg, jpeg.
+    """
+    elements_to_drop = []
+    fonts_to_unwrap = []
+    for element in tree.iter():
+        tag = element.tag
+        # Comments and processing instructions have no string tag
+        if not isinstance(tag, str):
+            continue
 
-    # Remove comment indicators
-    for indicator in soup.find_all(class_="comment-indicator"):
-        indicator.decompose()
+        # Remove head, style, script, video, audio tags and comment indicators
+        if tag in TAGS_TO_REMOVE or "comment-indicator" in element.classes:
+            elements_to_drop.append(element)
+            continue
 
-    # Remove HTML comments
-    html_without_comments = re.sub(r"<!--[\s\S]*?-->", "", str(soup))
+        # Remove unsupported images
+        if tag == "img":
+            src = element.get("src")
+            if _is_unsupported_image(src):
+                elements_to_drop.append(element)
+                continue
+            # mutool wraps base64 data; keep the data URI on one line (the
+            # HTML serializer would also percent-escape those newlines)
+            if src and src.startswith("data:"):
+                element.set("src", "".join(src.split()))
 
-    return html_without_comments
+        # Unwrap font tags
+        if tag == "font":
+            fonts_to_unwrap.append(element)
 
+        # Remove style and layout attributes; elements carry only a few
+        # attributes, so check those rather than every name in the list
+        attrib = element.attrib
+        if attrib:
+            for attr in [attr for attr in attrib if attr in ATTRS_TO_REMOVE]:
+                del attrib[attr]
 
-def _replace_images_with_base64(html_content: str, base_path: str) -> str:
+    for element in elements_to_drop:
+        element.drop_tree()
+    for font in fonts_to_unwrap:
+        font.drop_tag()
+
+
+def _replace_images_with_base64(tree, base_path: str) -> None:
     """
-    Replace image src with base64 data URIs.
+    Replace image src with base64 data URIs in place.
     Matches original document_parser.py _replace_images_with_base64.
     """
-    soup = BeautifulSoup(html_content, "html.parser")
     all_image_paths = set()
 
-    for img in soup.find_all("img"):
+    for img in tree.iter("img"):
         src = img.get("src")
         if src and not src.startswith("data:image/"):
             image_path = os.path.abspath(os.path.join(base_path, src))
@@ -86,8 +139,8 @@ def _replace_images_with_base64(html_content: str, base_path: str) -> str:
                     ext = os.path.splitext(image_path)[1][1:].lower()
                     if ext == "jpg":
                         ext = "jpeg"
-                    base64_data = base64.b64encode(image_data).decode()
-                    img["src"] = f"data:image/{ext};base64,{base64_data}"
+                    base64_data = pybase64.b64encode_as_string(image_data)
+                    img.set("src", f"data:image/{ext};base64,{base64_data}")
                     all_image_paths.add(image_path)
                 except Exception as e:
                     logger.warning(f"Failed to process image {image_path}: {e}")
@@ -99,57 +152,85 @@ def _replace_images_with_base64(html_content: str, base_path: str) -> str:
         except Exception:
             pass
 
-    return str(soup)
+
+def _split_pages(page_count: int, chunk_count: int) -> list[list[int]]:
+    """Split page indices into contiguous, evenly sized chunks."""
+    chunk_size, remainder = divmod(page_count, chunk_count)
+    chunks = []
+    start = 0
+    for i in range(chunk_count):
+        end = start + chunk_size + (1 if i < remainder else 0)
+        chunks.append(list(range(start, end)))
+        start = end
+    return chunks
 
 
-def _filter_unsupported_images(html_content: str) -> str:
+def split_pdf_pages(file_path: str) -> list[list[int]] | None:
     """
-    Remove images with unsupported formats.
-    Matches original _contain_unsupported_image behavior.
-    Only keeps png, jpg, jpeg.
+    Split a large PDF into page ranges that can be converted in parallel.
+
+    Pages are independent, so the ranges of a document with at least
+    pdf_parallel_min_pages pages are converted by separate parser processes
+    with parse_pdf_pages_to_markdown and concatenated in page order.
+    Returns None when the PDF is converted as a whole, which is always the
+    case with pdf_use_mutool.
     """
-    soup = BeautifulSoup(html_content, "html.parser")
+    if settings.pdf_use_mutool:
+        return None
 
-    for img in soup.find_all("img"):
-        src = img.get("src")
-        if not src:
-            continue
+    try:
+        with pymupdf.open(file_path) as doc:
+            page_count = doc.page_count
+    except Exception as e:
+        logger.error(f"pymupdf conversion failed: {e}")
+        raise RuntimeError(f"Failed to convert PDF: {e}")
 
-        extension = ""
-        if src.startswith("data:image/"):
-            # Extract format from base64 data URI
-            matches = re.match(r"^data:image/(\w+);base64", src)
-            if matches:
-                extension = matches.group(1).lower()
-        else:
-            # Extract from file extension
-            ext_matches = re.search(r"\.([a-zA-Z0-9]+)(\?|$)", src)
-            if ext_matches:
-                extension = ext_matches.group(1).lower()
+    chunk_count = min(settings.pdf_page_workers, page_count)
+    if chunk_count <= 1 or page_count < settings.pdf_parallel_min_pages:
+        return None
+    return _split_pages(page_count, chunk_count)
 
-        if extension and extension not in SUPPORTED_IMAGE_FORMATS:
-            logger.info(f"Removing unsupported image format: {extension}")
-            img.decompose()
 
-    return str(soup)
+def parse_pdf_pages_to_markdown(file_path: str, pages: list[int] | None = None) -> str:
+    """
+    Convert the given pages (all pages if None) of a PDF file to Markdown
+    in-process with pymupdf4llm.
 
+    Text and layout are extracted directly from the PDF, so there is no
+    mutool subprocess and no HTML intermediate. Images are rendered as PNG
+    data URIs, which is always a supported format. Blank lines are not
+    collapsed yet, so page ranges can be concatenated first.
+    """
+    # Imported here: pymupdf4llm loads onnxruntime, about 100 MB in every
+    # parser process, which the default mutool flow does not need
+    import pymupdf4llm
+
+    try:
+        # The layout model is on by default and makes the conversion about
+        # twice as slow; without it pymupdf4llm does not run OCR either
+        pymupdf4llm.use_layout(False)
+        return pymupdf4llm.to_markdown(
+            file_path,
+            pages=pages,
+            embed_images=True,
+            image_format="png",
+            show_progress=False,
+        )
+    except Exception as e:
+        logger.error(f"pymupdf conversion failed: {e}")
+        raise RuntimeError(f"Failed to convert PDF: {e}")
 
-def parse_pdf_to_markdown(file_path: str) -> str:
+
+def _parse_pdf_with_mutool(file_path: str) -> str:
     """
-    Convert a PDF file to Markdown format.
+    Convert a PDF file to Markdown through mutool HTML output.
 
     Processing steps (matching original document_parser.py):
     1. mutool convert PDF to HTML with preserved images
     2. Replace image file references with base64 data URIs
-    3. Clean HTML (remove styles, scripts, etc.)
-    4. Filter unsupported image formats
-    5. Convert HTML to Markdown
-
-    Args:
-        file_path: Path to the PDF file
-
-    Returns:
-        Markdown content as string
+    3. Clean HTML (remove styles, scripts, etc.) and filter unsupported
+       image formats in a single pass
+    4. Convert HTML to Markdown
     """
     # Create a temporary directory for the HTML output
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -182,36 +263,42 @@ def parse_pdf_to_markdown(file_path: str) -> str:
                 "apt-get install mupdf-tools"
             )
 
-        # Read the generated HTML
-        with open(output_html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
+        # Parse the generated HTML straight from disk, without reading
+        # it into an intermediate Python string first
+        tree = lxml_html.parse(output_html_path, HTML_PARSER).getroot()
+        if tree is None:
+            return ""
 
         # Step 2: Replace images with base64 data URIs (matching original)
-        html_content = _replace_images_with_base64(html_content, temp_dir)
+        _replace_images_with_base64(tree, temp_dir)
 
-        # Step 3: Clean the HTML (matching original _clean_html)
-        html_content = _clean_html(html_content)
+        # Step 3: Clean the HTML and filter unsupported images
+        # (matching original _clean_html and _contain_unsupported_image)
+        _clean_and_filter(tree)
 
-        # Step 4: Filter unsupported images (matching original _contain_unsupported_image)
-        html_content = _filter_unsupported_images(html_content)
+        # Step 4: Convert HTML to Markdown
+        return tree_to_markdown(tree)
 
-        # Step 5: Convert HTML to Markdown
-        markdown_content = markdownify(
-            html_content,
-            heading_style="ATX",
-            bullets="-",
-            strip=["style", "script"]
-        )
 
-        # Clean up extra whitespace
-        lines = markdown_content.split("\n")
-        cleaned_lines = []
-        prev_empty = False
-        for line in lines:
-            is_empty = not line.strip()
-            if is_empty and prev_empty:
-                continue
-            cleaned_lines.append(line)
-            prev_empty = is_empty
+def parse_pdf_to_markdown(file_path: str) -> str:
+    """
+    Convert a PDF file to Markdown format.
+
+    By default the PDF goes through the original mutool → HTML →
+    Markdown flow. With pdf_use_mutool disabled it is converted in-process
+    with pymupdf4llm instead, and large PDFs can be converted in page
+    ranges, see split_pdf_pages.
+
+    Args:
+        file_path: Path to the PDF file
+
+    Returns:
+        Markdown content as string
+    """
+    if settings.pdf_use_mutool:
+        markdown_content = _parse_pdf_with_mutool(file_path)
+    else:
+        markdown_content = parse_pdf_pages_to_markdown(file_path)
 
-        return "\n".join(cleaned_lines).strip()
+    # Clean up extra whitespace
+    return collapse_blank_lines(markdown_content)
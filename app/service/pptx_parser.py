@@ -6,18 +6,35 @@ Extracts slide content, tables, and images (as base64).
 Speaker notes are excluded (only visible slide content).
 """
 
-import base64
-import io
-import uuid
+import itertools
 import logging
+from typing import Iterator
+import pybase64
+from lxml import etree
 from pptx import Presentation
 from pptx.enum.shapes import MSO_SHAPE_TYPE
-from PIL import Image
+
+from app.core.config import settings
+from app.service._common import (
+    TABLE_CELL_ESCAPES, downscale_image, get_image_format, map_in_threads,
+    table_separator
+)
 
 logger = logging.getLogger(__name__)
 
 SUPPORTED_IMAGE_FORMATS = ["png", "jpg", "jpeg"]
 
+# Shape types compared for every shape, resolved from the enum once
+PICTURE_SHAPE = MSO_SHAPE_TYPE.PICTURE
+PLACEHOLDER_SHAPE = MSO_SHAPE_TYPE.PLACEHOLDER
+GROUP_SHAPE = MSO_SHAPE_TYPE.GROUP
+
+# Text of the runs of a paragraph (a:r elements, like paragraph.runs)
+RUN_TEXT_XPATH = etree.XPath(
+    "a:r/a:t/text()",
+    namespaces={"a": "http://schemas.openxmlformats.org/drawingml/2006/main"},
+)
+
 
 def _is_supported_image_format(img_format: str) -> bool:
     """Check if image format is supported (png, jpg, jpeg only)."""
@@ -34,7 +51,7 @@ def _extract_text_from_shape(shape) -> str:
 
     lines = []
     for paragraph in shape.text_frame.paragraphs:
-        text = "".join(run.text for run in paragraph.runs).strip()
+        text = "".join(RUN_TEXT_XPATH(paragraph._p)).strip()
         if text:
             # Check bullet level for indentation
             level = paragraph.level or 0
@@ -63,75 +80,84 @@ def _extract_table_from_shape(shape) -> str:
             # Get cell text, handling merged cells
             cell_text = cell.text.strip() if cell.text else ""
             # Escape pipe characters for markdown
-            cell_text = cell_text.replace("|", "\\|").replace("\n", "<br>")
+            cell_text = cell_text.translate(TABLE_CELL_ESCAPES)
             cells.append(cell_text)
         rows.append(cells)
 
     if not rows:
         return ""
 
-    # Build markdown table
-    lines = []
-
     # Header row (first row)
     header = rows[0]
-    lines.append("| " + " | ".join(header) + " |")
+    column_count = len(header)
 
-    # Separator row
-    lines.append("| " + " | ".join(["---"] * len(header)) + " |")
-
-    # Data rows
+    # Ensure data rows have same number of columns as header
     for row in rows[1:]:
-        # Ensure row has same number of columns as header
-        while len(row) < len(header):
-            row.append("")
-        lines.append("| " + " | ".join(row[:len(header)]) + " |")
+        row.extend([""] * (column_count - len(row)))
 
-    return "\n".join(lines)
+    # Build markdown table: header, separator and data rows in one join
+    return "\n".join(itertools.chain(
+        ("| " + " | ".join(header) + " |", table_separator(column_count)),
+        ("| " + " | ".join(row[:column_count]) + " |" for row in rows[1:]),
+    ))
 
 
-def _extract_image_from_shape(shape) -> dict | None:
+def _image_ids(slide_number: int) -> Iterator[str]:
+    """
+    Generate image ids for a slide. The slide number prefix keeps them
+    unique within the document without random UUIDs.
+    """
+    return (f"{slide_number:04x}{index:04x}" for index in itertools.count())
+
+
+def _extract_image_from_shape(shape, image_ids: Iterator[str]) -> dict | None:
     """
     Extract image from a picture shape and convert to base64.
-    Returns dict with data_uri and id, or None if unsupported format.
+    Returns dict with data_uri and id (taken from image_ids), or None if
+    unsupported format.
     """
     try:
         image = shape.image
         img_data = image.blob
 
-        # Get image format using PIL
-        with io.BytesIO(img_data) as buffer:
-            with Image.open(buffer) as pil_img:
-                img_format = pil_img.format.lower() if pil_img.format else "png"
+        # Get image format from the file signature, falling back to PIL
+        img_format = get_image_format(img_data)
 
         # Skip unsupported formats
         if not _is_supported_image_format(img_format):
             logger.info(f"Skipping unsupported image format: {img_format}")
             return None
 
+        # Shrink oversized images when image downscaling is enabled
+        img_data, img_format = downscale_image(img_data, img_format)
+
         # Convert to base64
-        base64_data = base64.b64encode(img_data).decode("utf-8")
+        base64_data = pybase64.b64encode_as_string(img_data)
         data_uri = f"data:image/{img_format};base64,{base64_data}"
 
         return {
             "data_uri": data_uri,
-            "id": uuid.uuid4().hex[:8]
+            "id": next(image_ids)
         }
     except Exception as e:
         logger.warning(f"Failed to extract image: {e}")
         return None
 
 
-def _get_slide_title(slide) -> str:
+def _get_slide_title(slide) -> tuple[str, int | None]:
     """
     Extract the title from a slide.
-    Returns empty string if no title placeholder found.
+    Returns (title_text, title_shape_id), with an empty string and None
+    if no title placeholder found.
     """
+    title_shape_id = None
     try:
-        if slide.shapes.title:
-            title_text = slide.shapes.title.text.strip()
+        title_shape = slide.shapes.title
+        if title_shape:
+            title_shape_id = title_shape.shape_id
+            title_text = title_shape.text.strip()
             if title_text:
-                return title_text
+                return title_text, title_shape_id
     except Exception:
         pass
 
@@ -146,12 +172,12 @@ def _get_slide_title(slide) -> str:
                 if ph_format and ph_format.type:
                     type_name = str(ph_format.type)
                     if "TITLE" in type_name:
-                        return shape.text.strip()
+                        return shape.text.strip(), shape.shape_id
         except Exception:
             # Skip shapes that cause errors
             continue
 
-    return ""
+    return "", title_shape_id
 
 
 def _slide_to_markdown(slide, slide_number: int) -> str:
@@ -161,8 +187,8 @@ def _slide_to_markdown(slide, slide_number: int) -> str:
     """
     parts = []
 
-    # Get slide title
-    title = _get_slide_title(slide)
+    # Get slide title and the shape it came from
+    title, title_shape_id = _get_slide_title(slide)
     if title:
         parts.append(f"## Slide {slide_number}: {title}")
     else:
@@ -170,37 +196,34 @@ def _slide_to_markdown(slide, slide_number: int) -> str:
 
     parts.append("")  # Empty line after heading
 
-    # Track shapes we've already processed (title)
-    processed_shapes = set()
-    try:
-        if slide.shapes.title:
-            processed_shapes.add(id(slide.shapes.title))
-    except Exception:
-        pass
-
     # Collect content from shapes
     text_content = []
     images = []
     tables = []
+    image_ids = _image_ids(slide_number)
 
     for shape in slide.shapes:
-        # Skip already processed shapes (like title)
-        if id(shape) in processed_shapes:
+        # Skip the title shape, already used for the heading. python-pptx
+        # creates a new proxy object on every access, so compare shape_id.
+        if shape.shape_id == title_shape_id:
             continue
 
+        # shape_type inspects the shape XML on every access, so read it once
+        shape_type = shape.shape_type
+
         # Handle pictures (both PICTURE shapes and placeholders with images)
-        if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-            img_data = _extract_image_from_shape(shape)
+        if shape_type == PICTURE_SHAPE:
+            img_data = _extract_image_from_shape(shape, image_ids)
             if img_data:
                 images.append(img_data)
             continue
 
         # Check if placeholder contains an image (image inserted into placeholder)
-        if shape.shape_type == MSO_SHAPE_TYPE.PLACEHOLDER:
+        if shape_type == PLACEHOLDER_SHAPE:
             try:
                 # Try to access the image property - if it exists, this is a picture placeholder
                 if hasattr(shape, 'image') and shape.image:
-                    img_data = _extract_image_from_shape(shape)
+                    img_data = _extract_image_from_shape(shape, image_ids)
                     if img_data:
                         images.append(img_data)
                     continue
@@ -216,11 +239,11 @@ def _slide_to_markdown(slide, slide_number: int) -> str:
             continue
 
         # Handle grouped shapes
-        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+        if shape_type == GROUP_SHAPE:
             try:
                 for sub_shape in shape.shapes:
-                    if sub_shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                        img_data = _extract_image_from_shape(sub_shape)
+                    if sub_shape.shape_type == PICTURE_SHAPE:
+                        img_data = _extract_image_from_shape(sub_shape, image_ids)
                         if img_data:
                             images.append(img_data)
                     elif hasattr(sub_shape, 'has_text_frame') and sub_shape.has_text_frame:
@@ -261,7 +284,7 @@ def parse_pptx_to_markdown(file_path: str) -> str:
 
     Processing steps:
     1. Load presentation with python-pptx
-    2. For each slide:
+    2. For each slide (in parallel threads):
        - Extract title from title placeholder
        - Extract text from content placeholders
        - Extract tables and convert to Markdown
@@ -290,11 +313,14 @@ def parse_pptx_to_markdown(file_path: str) -> str:
         Markdown content as string
     """
     prs = Presentation(file_path)
-
-    markdown_parts = []
-
-    for slide_number, slide in enumerate(prs.slides, start=1):
-        slide_md = _slide_to_markdown(slide, slide_number)
-        markdown_parts.append(slide_md)
+    slides = list(prs.slides)
+
+    # Slides are independent, so they are converted in parallel threads
+    markdown_parts = map_in_threads(
+        _slide_to_markdown,
+        slides,
+        range(1, len(slides) + 1),
+        max_workers=settings.parser_threads,
+    )
 
     return "\n".join(markdown_parts).strip()
@@ -9,36 +9,56 @@ which is lighter weight but may not preserve all formatting features.
 For full fidelity, LibreOffice would be required.
 """
 
-import base64
 import io
-import uuid
+import itertools
 import logging
+import zipfile
 import openpyxl
+import pybase64
+from lxml import etree
+from openpyxl.packaging.relationship import get_dependents, get_rels_path
 from PIL import Image
 
+from app.core.config import settings
+from app.service._common import (
+    TABLE_CELL_ESCAPES, downscale_image, get_image_format, map_in_threads,
+    table_separator
+)
+
 logger = logging.getLogger(__name__)
 
 SUPPORTED_IMAGE_FORMATS = ["png", "jpg", "jpeg"]
 
+# Formats openpyxl kept as they are; it converted any other image to PNG
+UNCONVERTED_IMAGE_FORMATS = ["png", "jpeg", "gif"]
+
+DRAWING_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/drawing"
+IMAGE_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+R_EMBED = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
+DRAWING_NAMESPACES = {
+    "xdr": "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+}
+
+# Drawing anchors in the order openpyxl collects their pictures
+ANCHOR_TAGS = ["xdr:absoluteAnchor", "xdr:oneCellAnchor", "xdr:twoCellAnchor"]
 
-def _get_cell_value(cell) -> str:
+
+def _get_cell_value(value) -> str:
     """
     Get cell value as string, handling None and special types.
     Matches original _trim_all_cell_whitespace behavior.
     """
-    if cell.value is None:
+    if value is None:
         return ""
-    value = str(cell.value)
     # Strip trailing whitespace (matching original _trim_all_cell_whitespace)
-    return value.rstrip()
+    return str(value).rstrip()
 
 
 def _escape_markdown_table_cell(value: str) -> str:
     """Escape special characters for markdown table cells."""
     # Replace pipe characters and newlines
-    value = value.replace("|", "\\|")
-    value = value.replace("\n", "<br>")
-    return value
+    return value.translate(TABLE_CELL_ESCAPES)
 
 
 def _is_supported_image_format(img_format: str) -> bool:
@@ -46,43 +66,99 @@ def _is_supported_image_format(img_format: str) -> bool:
     return img_format.lower() in SUPPORTED_IMAGE_FORMATS
 
 
-def _extract_images_from_sheet(ws) -> list[dict]:
+def _read_drawing_images(archive: zipfile.ZipFile, drawing_path: str) -> list[tuple]:
+    """
+    Read the pictures of a drawing part as (media path, anchor) tuples.
+    The anchor is the xdr:from element, or None for absolute anchors.
+    """
+    rels_path = get_rels_path(drawing_path)
+    if rels_path not in archive.namelist():
+        return []
+    dependents = get_dependents(archive, rels_path)
+
+    drawing = etree.fromstring(archive.read(drawing_path))
+    pictures = []
+    for anchor_tag in ANCHOR_TAGS:
+        for anchor in drawing.iterfind(anchor_tag, DRAWING_NAMESPACES):
+            # Like openpyxl, only the last picture of the anchor, or else of
+            # its group shape, is read
+            pics = (anchor.findall("xdr:pic", DRAWING_NAMESPACES)
+                    or anchor.findall("xdr:grpSp/xdr:pic", DRAWING_NAMESPACES))
+            if not pics:
+                continue
+            blip = pics[-1].find("xdr:blipFill/a:blip", DRAWING_NAMESPACES)
+            if blip is None or not blip.get(R_EMBED):
+                continue
+            try:
+                rel = dependents.get(blip.get(R_EMBED))
+            except KeyError:
+                continue
+            if rel.Type == IMAGE_REL_TYPE:
+                pictures.append((rel.target, anchor.find("xdr:from", DRAWING_NAMESPACES)))
+    return pictures
+
+
+def _read_sheet_images(archive: zipfile.ZipFile, sheet_path: str) -> list[tuple]:
+    """
+    Read the images of a worksheet straight from the xlsx archive.
+
+    Follows the worksheet → drawing → media relationships and returns
+    (media path, anchor) tuples in the order openpyxl loads sheet images,
+    without going through its drawing and image objects.
+    """
+    rels_path = get_rels_path(sheet_path)
+    if rels_path not in archive.namelist():
+        return []
+
+    pictures = []
+    for rel in get_dependents(archive, rels_path).find(DRAWING_REL_TYPE):
+        pictures.extend(_read_drawing_images(archive, rel.target))
+    return pictures
+
+
+def _extract_images_from_sheet(archive: zipfile.ZipFile, sheet_path: str,
+                               sheet_number: int) -> list[dict]:
     """
     Extract images from worksheet and return as base64 data URIs.
     Matches original _replace_excel_images_from_sheet behavior.
+    Image ids are numbered per sheet, prefixed by the sheet number.
     """
     images = []
+    image_index = itertools.count()
 
-    for image in ws._images:
+    for media_path, anchor in _read_sheet_images(archive, sheet_path):
         try:
-            img_data = image._data()
+            img_data = archive.read(media_path)
 
-            # Get image format using PIL
-            with io.BytesIO(img_data) as buffer:
-                with Image.open(buffer) as pil_img:
-                    img_format = pil_img.format.lower() if pil_img.format else "png"
-                    width_px, height_px = pil_img.size
+            # Get image format from the file signature, falling back to PIL
+            img_format = get_image_format(img_data)
+            if img_format not in UNCONVERTED_IMAGE_FORMATS:
+                img_data = _convert_to_png(img_data)
+                img_format = "png"
 
             # Skip unsupported formats (matching original supported_image list)
             if not _is_supported_image_format(img_format):
                 logger.info(f"Skipping unsupported image format: {img_format}")
                 continue
 
+            # Shrink oversized images when image downscaling is enabled
+            img_data, img_format = downscale_image(img_data, img_format)
+
             # Convert to base64
-            base64_data = base64.b64encode(img_data).decode("utf-8")
+            base64_data = pybase64.b64encode_as_string(img_data)
             data_uri = f"data:image/{img_format};base64,{base64_data}"
 
             # Get position info (matching original anchor handling)
-            from_col = image.anchor._from.col
-            from_row = image.anchor._from.row
+            if anchor is None:
+                raise ValueError(f"{media_path} is not anchored to a cell")
+            from_col = int(anchor.findtext("xdr:col", namespaces=DRAWING_NAMESPACES))
+            from_row = int(anchor.findtext("xdr:row", namespaces=DRAWING_NAMESPACES))
 
             images.append({
                 "data_uri": data_uri,
                 "row": from_row,
                 "col": from_col,
-                "width": width_px,
-                "height": height_px,
-                "id": uuid.uuid4().hex[:8]
+                "id": f"{sheet_number:04x}{next(image_index):04x}"
             })
         except Exception as e:
             logger.warning(f"Failed to extract image: {e}")
@@ -91,57 +167,55 @@ def _extract_images_from_sheet(ws) -> list[dict]:
     return images
 
 
-def _is_row_empty(ws, row_idx: int, min_col: int, max_col: int) -> bool:
-    """
-    Check if a row is entirely empty.
-    Matches original _identify_rows_to_delete logic.
-    """
-    for col_idx in range(min_col, max_col + 1):
-        cell = ws.cell(row=row_idx, column=col_idx)
-        if cell.value is not None:
-            return False
-    return True
+def _convert_to_png(img_data: bytes) -> bytes:
+    """Convert an image to PNG, as openpyxl did for uncommon formats."""
+    with io.BytesIO(img_data) as input_buffer:
+        with Image.open(input_buffer) as pil_img:
+            with io.BytesIO() as output_buffer:
+                pil_img.save(output_buffer, format="png")
+                return output_buffer.getvalue()
 
 
-def _is_col_empty(ws, col_idx: int, min_row: int, max_row: int) -> bool:
+def _read_values(ws) -> list[tuple]:
     """
-    Check if a column is entirely empty.
-    Matches original _identify_columns_to_delete logic.
+    Read all cell values of a worksheet in one pass, as a grid whose rows
+    and columns start at 1, so rows[r][c] is the cell at 0-based (r, c).
     """
-    for row_idx in range(min_row, max_row + 1):
-        cell = ws.cell(row=row_idx, column=col_idx)
-        if cell.value is not None:
-            return False
-    return True
-
-
-def _get_effective_range(ws) -> tuple:
+    # The dimensions stored in the file can be wrong; read every row as
+    # written and pad the rows to the widest one instead
+    ws.reset_dimensions()
+    rows = list(ws.iter_rows(values_only=True))
+    width = max(map(len, rows), default=0)
+    return [
+        row if len(row) == width else tuple(row) + (None,) * (width - len(row))
+        for row in rows
+    ]
+
+
+def _get_effective_range(rows: list[tuple]) -> tuple:
     """
-    Get the effective data range, excluding empty rows/columns.
+    Get the effective data range of the sheet values, excluding leading and
+    trailing empty rows/columns. Indices are 0-based and inclusive; an
+    empty sheet gives max_row < min_row.
     Matches original _reduce_excel behavior.
     """
-    min_row = ws.min_row or 1
-    max_row = ws.max_row or 1
-    min_col = ws.min_column or 1
-    max_col = ws.max_column or 1
+    # Rows with a value (matching original _identify_rows_to_delete)
+    filled_rows = [
+        row_idx for row_idx, row in enumerate(rows)
+        if any(value is not None for value in row)
+    ]
+    if not filled_rows:
+        return 0, -1, 0, -1
+    min_row, max_row = filled_rows[0], filled_rows[-1]
 
-    # Skip leading empty rows
-    while min_row <= max_row and _is_row_empty(ws, min_row, min_col, max_col):
-        min_row += 1
+    # Columns with a value within those rows, scanned column-wise with zip
+    # (matching original _identify_columns_to_delete)
+    filled_cols = [
+        col_idx for col_idx, column in enumerate(zip(*rows[min_row:max_row + 1]))
+        if any(value is not None for value in column)
+    ]
 
-    # Skip trailing empty rows
-    while max_row >= min_row and _is_row_empty(ws, max_row, min_col, max_col):
-        max_row -= 1
-
-    # Skip leading empty columns
-    while min_col <= max_col and _is_col_empty(ws, min_col, min_row, max_row):
-        min_col += 1
-
-    # Skip trailing empty columns
-    while max_col >= min_col and _is_col_empty(ws, max_col, min_row, max_row):
-        max_col -= 1
-
-    return min_row, max_row, min_col, max_col
+    return min_row, max_row, filled_cols[0], filled_cols[-1]
 
 
 def _sheet_to_markdown_table(ws, sheet_name: str, images: list[dict]) -> str:
@@ -149,58 +223,71 @@ def _sheet_to_markdown_table(ws, sheet_name: str, images: list[dict]) -> str:
     Convert a worksheet to markdown table format.
     Includes image references at their anchor positions.
     """
-    lines = []
+    buffer = io.StringIO()
 
     # Add sheet header
-    lines.append(f"## Sheet: {sheet_name}\n")
+    buffer.write(f"## Sheet: {sheet_name}\n\n")
+
+    rows = _read_values(ws)
 
     # Get effective data range (matching original _reduce_excel behavior)
-    min_row, max_row, min_col, max_col = _get_effective_range(ws)
+    min_row, max_row, min_col, max_col = _get_effective_range(rows)
 
     # Check if sheet has data
     if max_row < min_row or max_col < min_col:
-        lines.append("*Empty sheet*\n")
-        return "\n".join(lines)
+        buffer.write("*Empty sheet*\n")
+        return buffer.getvalue()
+
+    # Group images by their anchor cell so each cell needs a single lookup
+    images_at = {}
+    for img in images:
+        images_at.setdefault((img["row"], img["col"]), []).append(img)
 
     # Build the table
     table_rows = []
     for row_idx in range(min_row, max_row + 1):
+        row = rows[row_idx]
         row_cells = []
         for col_idx in range(min_col, max_col + 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            value = _get_cell_value(cell)
+            value = _get_cell_value(row[col_idx])
 
-            # Check if there's an image at this position
-            # Note: image anchor uses 0-based indexing
-            for img in images:
-                if img["row"] == row_idx - 1 and img["col"] == col_idx - 1:
-                    img_md = f"![image-{img['id']}]({img['data_uri']})"
-                    value = f"{value} {img_md}" if value else img_md
+            # Add images anchored at this position
+            # Note: image anchor uses 0-based indexing, like rows
+            for img in images_at.get((row_idx, col_idx), ()):
+                img_md = f"![image-{img['id']}]({img['data_uri']})"
+                value = f"{value} {img_md}" if value else img_md
 
             row_cells.append(_escape_markdown_table_cell(value))
         table_rows.append(row_cells)
 
     if not table_rows:
-        lines.append("*Empty sheet*\n")
-        return "\n".join(lines)
+        buffer.write("*Empty sheet*\n")
+        return buffer.getvalue()
 
-    # Create markdown table
     # Header row (first data row becomes header)
     header = table_rows[0]
-    lines.append("| " + " | ".join(header) + " |")
+    column_count = len(header)
+
+    # Every row spans min_col..max_col, so rows need no padding
+    # Create markdown table: header, separator and data rows in one join
+    buffer.write("\n".join(itertools.chain(
+        ("| " + " | ".join(header) + " |", table_separator(column_count)),
+        ("| " + " | ".join(row) + " |" for row in table_rows[1:]),
+    )))
+    buffer.write("\n")
 
-    # Separator row
-    lines.append("| " + " | ".join(["---"] * len(header)) + " |")
+    return buffer.getvalue()
 
-    # Data rows
-    for row in table_rows[1:]:
-        # Ensure row has same number of columns as header
-        while len(row) < len(header):
-            row.append("")
-        lines.append("| " + " | ".join(row[:len(header)]) + " |")
 
-    lines.append("")  # Empty line after table
-    return "\n".join(lines)
+def _sheet_to_markdown(ws, sheet_number: int, archive: zipfile.ZipFile) -> str:
+    """Convert a single worksheet, including its images, to Markdown."""
+    # Extract images (matching original _replace_excel_images_from_sheet).
+    # Read-only worksheets do not load images, so they are read from the
+    # archive directly.
+    images = _extract_images_from_sheet(archive, ws._worksheet_path, sheet_number)
+
+    # Convert sheet to markdown table
+    return _sheet_to_markdown_table(ws, ws.title, images)
 
 
 def parse_xlsx_to_markdown(file_path: str) -> str:
@@ -212,8 +299,9 @@ def parse_xlsx_to_markdown(file_path: str) -> str:
     for HTML conversion which preserves more complex formatting.
 
     Processing steps (matching original where applicable):
-    1. Load workbook with data_only=True (get computed values)
-    2. For each sheet:
+    1. Load workbook with data_only=True (get computed values) in
+       read-only mode, which streams cell values from the file
+    2. For each sheet (in parallel threads):
        - Extract images with base64 encoding
        - Skip empty rows/columns (like original _reduce_excel)
        - Convert to markdown table format
@@ -224,20 +312,20 @@ def parse_xlsx_to_markdown(file_path: str) -> str:
     Returns:
         Markdown content as string with tables for each sheet
     """
-    wb = openpyxl.load_workbook(file_path, data_only=True)
-
-    markdown_parts = []
-
-    for sheet_name in wb.sheetnames:
-        ws = wb[sheet_name]
-
-        # Extract images (matching original _replace_excel_images_from_sheet)
-        images = _extract_images_from_sheet(ws)
-
-        # Convert sheet to markdown table
-        sheet_md = _sheet_to_markdown_table(ws, sheet_name, images)
-        markdown_parts.append(sheet_md)
-
-    wb.close()
+    wb = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
+    try:
+        worksheets = [wb[sheet_name] for sheet_name in wb.sheetnames]
+
+        # Sheets are independent, so they are converted in parallel threads
+        with zipfile.ZipFile(file_path) as archive:
+            markdown_parts = map_in_threads(
+                _sheet_to_markdown,
+                worksheets,
+                itertools.count(1),
+                itertools.repeat(archive),
+                max_workers=settings.parser_threads,
+            )
+    finally:
+        wb.close()
 
     return "\n".join(markdown_parts)
@@ -7,11 +7,105 @@ All images are converted to PNG format for consistency.
 
 import re
 import uuid
-import base64
 import io
+import threading
 from typing import Tuple, Dict
+import pybase64
 from PIL import Image
 
+# Markdown images with an inline data URI: ![alt](data:image/format;base64,...)
+# The payload is matched possessively, so long base64 strings are consumed
+# without saving backtracking positions.
+IMAGE_PATTERN = re.compile(r'!\[([^\]]*)\]\((data:image/(\w+);base64,([^)]++))\)')
+
+# Every match contains this marker; documents without it are left untouched
+DATA_URI_MARKER = "](data:image/"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# PNG color types PIL opens as "L" and "RGB", the modes saved unchanged
+PNG_PLAIN_COLOR_TYPES = (0, 2)
+
+# Per-thread buffer the PNG conversion writes into, reused across images
+_local = threading.local()
+
+
+def _get_output_buffer() -> io.BytesIO:
+    """Return this thread's PNG output buffer, positioned at the start."""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = io.BytesIO()
+    buffer.seek(0)
+    return buffer
+
+
+def _is_plain_png(base64_data: str) -> bool:
+    """
+    Check whether base64_data is an 8-bit grayscale or RGB PNG, which the
+    PIL conversion would re-encode without changing a pixel. Only the
+    signature and IHDR chunk at the start of the data are decoded.
+    """
+    try:
+        header = pybase64.b64decode(base64_data[:36], validate=True)
+    except ValueError:
+        return False
+    # Truncated data may end before the bit depth and color type fields
+    return (
+        len(header) >= 26
+        and header.startswith(PNG_SIGNATURE)
+        and header[12:16] == b"IHDR"
+        and header[24] == 8
+        and header[25] in PNG_PLAIN_COLOR_TYPES
+    )
+
+
+def _convert_to_png(base64_data: str) -> str:
+    """
+    Convert a base64 encoded image to PNG, flattening transparency onto a
+    white background. Returns the original data if it cannot be decoded.
+    """
+    # Decode base64 to bytes
+    try:
+        img_bytes = pybase64.b64decode(base64_data, validate=False)
+    except Exception:
+        # If base64 decode fails, skip this image
+        img_bytes = None
+
+    if not img_bytes:
+        # If base64 decode failed, keep original
+        return base64_data
+
+    # Convert to PNG using PIL
+    try:
+        with io.BytesIO(img_bytes) as input_buffer:
+            with Image.open(input_buffer) as img:
+                # Convert to RGB if necessary (for transparency handling)
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    # Create a white background for transparent images
+                    if img.mode == 'RGBA' or (img.mode == 'P' and 'transparency' in img.info):
+                        background = Image.new('RGB', img.size, (255, 255, 255))
+                        if img.mode == 'P':
+                            img = img.convert('RGBA')
+                        background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
+                        img = background
+                    else:
+                        img = img.convert('RGB')
+                elif img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+
+                # Save as PNG; the fastest zlib level keeps re-encoding cheap.
+                # The buffer is reused, so drop what is left of a larger image.
+                output_buffer = _get_output_buffer()
+                img.save(output_buffer, format='PNG', compress_level=1)
+                output_buffer.truncate()
+
+                # Encode to base64 straight from the buffer, without a bytes copy
+                with output_buffer.getbuffer() as png_bytes:
+                    return pybase64.b64encode_as_string(png_bytes)
+    except Exception:
+        # If conversion fails, keep as is but still use PNG extension
+        # This handles corrupted or truncated images
+        return base64_data
+
 
 def extract_and_replace_images(markdown_content: str) -> Tuple[str, Dict[str, str]]:
     """
@@ -25,57 +119,21 @@ def extract_and_replace_images(markdown_content: str) -> Tuple[str, Dict[str, st
         - Modified markdown with UUID image references
         - Dictionary with UUID filenames as keys and base64 data URIs as values (all as PNG)
     """
-    images = {}
+    # Most text-only documents have no inline images at all
+    if DATA_URI_MARKER not in markdown_content:
+        return markdown_content, {}
 
-    # Pattern to match markdown images: ![alt](data:image/format;base64,...)
-    img_pattern = re.compile(r'!\[([^\]]*)\]\((data:image/(\w+);base64,([^)]+))\)')
+    images = {}
 
     def replace_image(match):
         alt_text = match.group(1)
-        full_data_uri = match.group(2)
-        original_format = match.group(3).lower()
         base64_data = match.group(4)
 
-        # Decode base64 to bytes
-        try:
-            img_bytes = base64.b64decode(base64_data)
-        except Exception:
-            # If base64 decode fails, skip this image
-            img_bytes = None
-
-        if img_bytes:
-            # Convert to PNG using PIL
-            try:
-                with io.BytesIO(img_bytes) as input_buffer:
-                    with Image.open(input_buffer) as img:
-                        # Convert to RGB if necessary (for transparency handling)
-                        if img.mode in ('RGBA', 'LA', 'P'):
-                            # Create a white background for transparent images
-                            if img.mode == 'RGBA' or (img.mode == 'P' and 'transparency' in img.info):
-                                background = Image.new('RGB', img.size, (255, 255, 255))
-                                if img.mode == 'P':
-                                    img = img.convert('RGBA')
-                                background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
-                                img = background
-                            else:
-                                img = img.convert('RGB')
-                        elif img.mode not in ('RGB', 'L'):
-                            img = img.convert('RGB')
-
-                        # Save as PNG
-                        output_buffer = io.BytesIO()
-                        img.save(output_buffer, format='PNG', optimize=True)
-                        png_bytes = output_buffer.getvalue()
-
-                        # Encode to base64
-                        png_base64 = base64.b64encode(png_bytes).decode('utf-8')
-            except Exception:
-                # If conversion fails, keep as is but still use PNG extension
-                # This handles corrupted or truncated images
-                png_base64 = base64_data
-        else:
-            # If base64 decode failed, keep original
+        # PNGs the conversion would not change are kept without a round trip
+        if _is_plain_png(base64_data):
             png_base64 = base64_data
+        else:
+            png_base64 = _convert_to_png(base64_data)
 
         # Generate UUID for this image
         image_id = uuid.uuid4().hex[:16]
@@ -88,6 +146,6 @@ def extract_and_replace_images(markdown_content: str) -> Tuple[str, Dict[str, st
         return f"![{alt_text}]({image_filename})"
 
     # Replace all images in the content
-    modified_content = img_pattern.sub(replace_image, markdown_content)
+    modified_content = IMAGE_PATTERN.sub(replace_image, markdown_content)
 
-    return modified_content, images
\ No newline at end of file
+    return modified_content, images
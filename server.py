@@ -2,14 +2,21 @@ import socket
 import uvicorn
 
 
-def is_port_in_use(port: int) -> bool:
+def is_port_in_use(port: int, host: str = "0.0.0.0") -> bool:
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        return sock.connect_ex(("localhost", port)) == 0
+        # Same option uvicorn sets, so lingering TIME_WAIT sockets do not count
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((host, port))
+        except OSError:
+            return True
+        return False
 
 
 if __name__ == "__main__":
+    host = "0.0.0.0"
     port = 7656
-    if not is_port_in_use(port):
-        uvicorn.run("app.main:app", host="0.0.0.0", port=port, reload=True)
+    if not is_port_in_use(port, host):
+        uvicorn.run("app.main:app", host=host, port=port, reload=True)
     else:
         print(f"Port {port} is already in use. Please free up the port and try again.")
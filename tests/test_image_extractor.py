@@ -0,0 +1,53 @@
+"""
+Tests for the inline image extraction.
+"""
+
+import io
+
+import pybase64
+import pytest
+from PIL import Image
+
+from app.utils.image_extractor import extract_and_replace_images
+
+
+def _png(mode: str) -> bytes:
+    with io.BytesIO() as buffer:
+        Image.new(mode, (4, 3)).save(buffer, format="png")
+        return buffer.getvalue()
+
+
+def _extract_single(img_data: bytes, img_format: str = "png") -> str:
+    """Run one image through the extractor and return its stored base64 data."""
+    base64_data = pybase64.b64encode_as_string(img_data)
+    markdown, images = extract_and_replace_images(
+        f"text ![alt](data:image/{img_format};base64,{base64_data}) more"
+    )
+    (filename, data_uri), = images.items()
+    assert markdown == f"text ![alt]({filename}) more"
+    assert data_uri.startswith("data:image/png;base64,")
+    return data_uri[len("data:image/png;base64,"):]
+
+
+@pytest.mark.parametrize("length", [8, 16, 24, 25, 26, 33])
+def test_truncated_png_is_kept_unchanged(length):
+    truncated = _png("RGB")[:length]
+    assert _extract_single(truncated) == pybase64.b64encode_as_string(truncated)
+
+
+def test_plain_png_is_kept_unchanged():
+    png = _png("RGB")
+    assert _extract_single(png) == pybase64.b64encode_as_string(png)
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "P", "LA"])
+def test_other_pngs_are_flattened_to_rgb(mode):
+    converted = pybase64.b64decode(_extract_single(_png(mode)))
+    with Image.open(io.BytesIO(converted)) as img:
+        assert img.format == "PNG"
+        assert img.mode == "RGB"
+        assert img.size == (4, 3)
+
+
+def test_markdown_without_images_is_unchanged():
+    assert extract_and_replace_images("# Title\n\nNo images") == ("# Title\n\nNo images", {})
@@ -0,0 +1,111 @@
+"""
+Parity tests for the lxml Markdown emitter.
+
+html_to_markdown ports the markdownify rules used by the DOCX and mutool
+PDF pipelines, so for the HTML those pipelines produce it must return the
+same Markdown as markdownify with the options of tree_to_markdown.
+"""
+
+import pytest
+from lxml import html as lxml_html
+from markdownify import markdownify
+
+from app.service import docx_parser, pdf_parser
+from app.service.markdown_emitter import html_to_markdown
+
+
+# Fragments shaped like mammoth output (DOCX)
+MAMMOTH_HTML = {
+    "paragraphs": "<p>First paragraph</p><p>Second <strong>bold</strong> and <em>italic</em></p>",
+    "headings": "<h1>Title</h1><h2>Sub <em>title</em></h2><h3>Third</h3><h6>Sixth</h6><p>Body</p>",
+    "escaping": "<p>snake_case and 2*3*4 with <strong>*stars*</strong></p><h1>under_score</h1>",
+    "inline_spaces": "<p>a<strong> bold </strong>b<em> </em>c<s>gone</s><sup>1</sup><sub>2</sub></p>",
+    "line_breaks": "<p>line one<br />line two<br /></p><h2>head<br />ing</h2>",
+    "bullets": "<ul><li>one</li><li>two</li><li>three</li></ul><p>after</p>",
+    "numbered": '<ol><li>one</li><li>two</li></ol><ol start="5"><li>five</li><li>six</li></ol>',
+    "nested_lists": (
+        "<ul><li>top<ul><li>nested<ol><li>deep</li><li>deeper</li></ol></li>"
+        "<li>nested two</li></ul></li><li>top two</li></ul><p>text</p>"
+    ),
+    "adjacent_lists": "<ul><li>a</li></ul><ol><li>b</li></ol><ul><li>c</li></ul>",
+    "list_paragraphs": "<ul><li><p>para item</p></li><li><p>multi</p><p>para</p></li></ul>",
+    "table_without_thead": (
+        "<table><tr><td><p>a</p></td><td><p>b|c</p></td></tr>"
+        "<tr><td><p>1</p></td><td><p>2</p></td></tr></table>"
+    ),
+    "table_with_thead": (
+        "<table><thead><tr><th>H1</th><th>H2</th></tr></thead>"
+        "<tbody><tr><td>1</td><td>2</td></tr><tr><td>3</td><td>4</td></tr></tbody></table>"
+    ),
+    "table_tbody_only": (
+        "<table><tbody><tr><td>x</td><td>y</td></tr><tr><td>z</td><td>w</td></tr></tbody></table>"
+    ),
+    "table_colspan": (
+        '<table><tr><th colspan="2">wide</th><th>narrow</th></tr>'
+        '<tr><td>1</td><td colspan="2">span</td></tr><tr><td colspan="x">bad</td></tr></table>'
+    ),
+    "table_cell_markup": (
+        "<table><tr><td><p>multi</p><p>para</p></td><td><ul><li>item</li></ul></td></tr>"
+        "<tr><td><strong>bold</strong></td><td><h1>heading</h1></td></tr>"
+        "<tr><td>line\nbreak</td><td><pre>pre\ncell</pre></td></tr></table><p>after</p>"
+    ),
+    "links": (
+        '<p>See <a href="https://example.com">the site</a>, '
+        '<a href="https://example.com/a_b">https://example.com/a_b</a> and '
+        '<a href="https://x.y" title="T &quot;q&quot;">titled</a>'
+        '<a id="bookmark"></a><a href="#anchor"> spaced </a></p>'
+    ),
+    "images": (
+        '<p><img alt="logo" src="data:image/png;base64,iVBORw0KGgo=" /></p>'
+        '<p>inline <img src="data:image/jpeg;base64,/9j/4AAQ" alt="" title="t" /> text</p>'
+        '<h2>in <img alt="heading alt" src="data:image/png;base64,AAAA" /> heading</h2>'
+    ),
+    "code": (
+        "<pre>def f(x):\n    return x_1 * 2\n</pre><p>use <code>a_b*c</code> here</p>"
+        "<pre><code>block_code\n  indented</code></pre>"
+    ),
+    "blockquote": "<blockquote><p>quoted</p><p>two</p></blockquote><p>after</p>",
+    "misc_blocks": "<hr /><p>x</p><figure><img src='a.png' alt='f'/><figcaption>cap</figcaption></figure>",
+    "whitespace": "<p>  leading   and\n\ttrailing  </p>\n\n<p>\n</p><div>  div <span> span </span> </div>",
+    "empty_elements": "<p></p><strong></strong><em> </em><ul></ul><table></table><h1></h1><p>end</p>",
+}
+
+# Fragments shaped like mutool HTML output (PDF)
+MUTOOL_HTML = {
+    "pages": (
+        '<div id="page0" style="width:595.0pt">\n<p style="top:56.0pt">'
+        '<span style="font-size:20.0pt">Heading_text</span></p>\n<p style="top:111.2pt">'
+        '<span>Body</span> <span>text *here*</span></p>\n</div>\n'
+        '<div id="page1">\n<p><span>Page 2</span></p>\n</div>'
+    ),
+    "image_and_font": (
+        '<div id="page0"><p><span>text</span></p>\n<img style="position:absolute" '
+        'src="data:image/png;base64,\niVBORw0KGgo\nAAAA">\n</div><font color=red>F</font>'
+    ),
+    "head_and_comments": (
+        "<html><head><style>p{margin:0}</style><title>t</title></head>"
+        "<body><!-- generated --><p>kept</p><script>drop()</script></body></html>"
+    ),
+}
+
+
+def _assert_parity(html: str, clean_and_filter, parser) -> None:
+    tree = lxml_html.document_fromstring(html, parser=parser)
+    clean_and_filter(tree)
+    expected = markdownify(
+        lxml_html.tostring(tree, encoding="unicode"),
+        heading_style="ATX",
+        bullets="-",
+        strip=["style", "script"]
+    )
+    assert html_to_markdown(tree) == expected
+
+
+@pytest.mark.parametrize("html", MAMMOTH_HTML.values(), ids=MAMMOTH_HTML.keys())
+def test_mammoth_html_matches_markdownify(html):
+    _assert_parity(html, docx_parser._clean_and_filter, docx_parser.HTML_PARSER)
+
+
+@pytest.mark.parametrize("html", MUTOOL_HTML.values(), ids=MUTOOL_HTML.keys())
+def test_mutool_html_matches_markdownify(html):
+    _assert_parity(html, pdf_parser._clean_and_filter, pdf_parser.HTML_PARSER)
@@ -0,0 +1,159 @@
+"""
+Parity tests for the XLSX image extraction.
+
+Read-only worksheets do not load images, so xlsx_parser follows the
+worksheet → drawing → media relationships itself. For every anchor kind it
+must return the same images, in the same order, as the extraction over the
+images openpyxl loads for a normal-mode worksheet.
+"""
+
+import io
+import itertools
+import zipfile
+
+import openpyxl
+import pybase64
+import pytest
+from lxml import etree
+from openpyxl.drawing.image import Image as XLImage
+from openpyxl.drawing.spreadsheet_drawing import AbsoluteAnchor, AnchorMarker, TwoCellAnchor
+from openpyxl.drawing.xdr import XDRPoint2D, XDRPositiveSize2D
+from PIL import Image
+
+from app.service import xlsx_parser
+from app.service._common import get_image_format
+
+XDR = "{%s}" % xlsx_parser.DRAWING_NAMESPACES["xdr"]
+
+
+def _image(img_format: str, color: str = "red") -> bytes:
+    with io.BytesIO() as buffer:
+        Image.new("RGB", (4, 3), color).save(buffer, format=img_format)
+        return buffer.getvalue()
+
+
+def _two_cell() -> TwoCellAnchor:
+    return TwoCellAnchor(_from=AnchorMarker(col=3, row=3), to=AnchorMarker(col=5, row=6))
+
+
+def _absolute() -> AbsoluteAnchor:
+    return AbsoluteAnchor(pos=XDRPoint2D(x=0, y=0), ext=XDRPositiveSize2D(cx=38100, cy=28575))
+
+
+def _replace_media(media: str, img_format: str):
+    """Patch that swaps the bytes of a media part for another image format."""
+    return media, lambda data: _image(img_format)
+
+
+def _group_pictures(*indexes: int):
+    """
+    Patch that moves the pictures of the given anchors of the first drawing
+    into one group shape, kept in the place of the first of those anchors.
+    """
+    def patch(data: bytes) -> bytes:
+        drawing = etree.fromstring(data)
+        anchors = list(drawing)
+        group = etree.fromstring(
+            f'<grpSp xmlns="{XDR[1:-1]}"><nvGrpSpPr><cNvPr id="100" name="Group 1"/>'
+            "<cNvGrpSpPr/></nvGrpSpPr><grpSpPr/></grpSp>"
+        )
+        for index in indexes:
+            group.append(anchors[index].find(f"{XDR}pic"))
+        anchors[indexes[0]].insert(2, group)
+        for index in indexes[1:]:
+            drawing.remove(anchors[index])
+        return etree.tostring(drawing)
+    return "xl/drawings/drawing1.xml", patch
+
+
+# Images per sheet as (anchor, format) pairs, and patches of archive parts
+CASES = {
+    "one_cell": ([[("B2", "png")]], []),
+    "two_cell": ([[(_two_cell, "png")]], []),
+    "absolute": ([[(_absolute, "png"), ("B2", "jpeg")]], []),
+    "anchor_order": (
+        [[(_two_cell, "png"), ("C3", "jpeg"), (_absolute, "png"), ("A1", "png"), (_two_cell, "jpeg")]],
+        [],
+    ),
+    "same_cell": ([[("C3", "png"), ("C3", "jpeg"), ("C3", "png"), ("D3", "png")]], []),
+    "several_sheets": ([[("B2", "png")], [], [("A1", "jpeg"), (_two_cell, "png")]], []),
+    "gif_medium": ([[("B2", "gif"), ("C2", "png")]], []),
+    "bmp_medium": ([[("B2", "png"), ("C2", "png")]], [_replace_media("xl/media/image1.png", "bmp")]),
+    "tiff_medium": ([[("B2", "png")]], [_replace_media("xl/media/image1.png", "tiff")]),
+    "group_shape": ([[("B2", "png"), ("C3", "jpeg")]], [_group_pictures(1)]),
+    "group_two_pictures": (
+        [[("A1", "png"), ("B2", "jpeg"), ("C3", "png")]],
+        [_group_pictures(1, 2)],
+    ),
+}
+
+
+def _build_workbook(path, sheets: list, patches: list) -> None:
+    wb = openpyxl.Workbook()
+    colors = itertools.cycle(["red", "green", "blue", "white"])
+    for sheet_number, sheet_images in enumerate(sheets):
+        ws = wb.active if sheet_number == 0 else wb.create_sheet()
+        # Fill a range wide enough to hold every anchor
+        for row in ws.iter_rows(min_row=1, max_row=8, max_col=8):
+            for cell in row:
+                cell.value = cell.coordinate
+        for anchor, img_format in sheet_images:
+            image = XLImage(io.BytesIO(_image(img_format, next(colors))))
+            ws.add_image(image, anchor if isinstance(anchor, str) else None)
+            if not isinstance(anchor, str):
+                image.anchor = anchor()
+    wb.save(path)
+
+    if patches:
+        with zipfile.ZipFile(path) as archive:
+            parts = {name: archive.read(name) for name in archive.namelist()}
+        for name, patch in patches:
+            parts[name] = patch(parts[name])
+        with zipfile.ZipFile(path, "w") as archive:
+            for name, data in parts.items():
+                archive.writestr(name, data)
+
+
+def _expected_images(path) -> list[list[dict]]:
+    """The sheet images as extracted from a normal-mode openpyxl load."""
+    wb = openpyxl.load_workbook(path, data_only=True)
+    sheets = []
+    for sheet_number, ws in enumerate(wb.worksheets, 1):
+        images = []
+        image_index = itertools.count()
+        for image in ws._images:
+            try:
+                img_data = image._data()
+                img_format = get_image_format(img_data)
+                if not xlsx_parser._is_supported_image_format(img_format):
+                    continue
+                base64_data = pybase64.b64encode_as_string(img_data)
+                images.append({
+                    "data_uri": f"data:image/{img_format};base64,{base64_data}",
+                    "row": image.anchor._from.row,
+                    "col": image.anchor._from.col,
+                    "id": f"{sheet_number:04x}{next(image_index):04x}"
+                })
+            except Exception:
+                continue
+        sheets.append(images)
+    return sheets
+
+
+def _extracted_images(path) -> list[list[dict]]:
+    wb = openpyxl.load_workbook(path, data_only=True, read_only=True)
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return [
+                xlsx_parser._extract_images_from_sheet(archive, ws._worksheet_path, sheet_number)
+                for sheet_number, ws in enumerate(wb.worksheets, 1)
+            ]
+    finally:
+        wb.close()
+
+
+@pytest.mark.parametrize("sheets, patches", CASES.values(), ids=CASES.keys())
+def test_sheet_images_match_openpyxl(tmp_path, sheets, patches):
+    path = tmp_path / "images.xlsx"
+    _build_workbook(path, sheets, patches)
+    assert _extracted_images(path) == _expected_images(path)